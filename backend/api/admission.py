@@ -0,0 +1,128 @@
+import functools
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.response import Response
+
+DEFAULT_LIMITS = {'slots': 2, 'queue': 8, 'timeout': 2.0}
+
+
+class AdmissionController:
+    """Bound how many requests run an expensive endpoint at once.
+
+    Up to ``slots`` requests run; up to ``max_queue`` more wait at most
+    ``timeout`` seconds for a slot. Anything beyond that is rejected at
+    once, so a burst turns into fast 503s instead of a growing backlog
+    holding every worker.
+    """
+
+    def __init__(self, name, slots, max_queue, timeout, retry_after=1):
+        self.name = name
+        self.slots = slots
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def acquire(self):
+        with self._condition:
+            if self._active < self.slots and self._waiting == 0:
+                self._active += 1
+                self.admitted += 1
+                return True
+            if self._waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            self._waiting += 1
+            self.queued += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self._active >= self.slots:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        self.rejected += 1
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'slots': self.slots,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'waiting': self._waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(name):
+    """Per-process controller for ``name``, configured by ADMISSION_CONTROL."""
+    controller = _controllers.get(name)
+    if controller is None:
+        with _controllers_lock:
+            controller = _controllers.get(name)
+            if controller is None:
+                limits = {**DEFAULT_LIMITS, **getattr(settings, 'ADMISSION_CONTROL', {}).get(name, {})}
+                controller = AdmissionController(
+                    name,
+                    slots=limits['slots'],
+                    max_queue=limits['queue'],
+                    timeout=limits['timeout'],
+                    retry_after=getattr(settings, 'ADMISSION_RETRY_AFTER_SECONDS', 1),
+                )
+                _controllers[name] = controller
+    return controller
+
+
+def admission_stats():
+    return {name: controller.stats() for name, controller in sorted(_controllers.items())}
+
+
+def busy_response(controller):
+    return Response(
+        {"error": f"Too many {controller.name} requests in progress, retry later"},
+        status=503,
+        headers={'Retry-After': str(controller.retry_after)},
+    )
+
+
+def admission_controlled(name):
+    """Run a view method only once the ``name`` controller admits the request."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            controller = get_controller(name)
+            if not controller.acquire():
+                return busy_response(controller)
+            try:
+                return view(self, request, *args, **kwargs)
+            finally:
+                controller.release()
+        return wrapper
+    return decorator
@@ -0,0 +1,225 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from .similarity import top_k
+from .tfidf_artifact import ARTIFACT_DIR, current_version, publish_version
+
+ANN_DIR = os.path.join(ARTIFACT_DIR, 'ann')
+
+
+def _nearest(vectors, centroids, chunk_size=65536):
+    """Index of the closest centroid (L2) for every row, in bounded chunks."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        labels[start:start + chunk_size] = np.argmax(2 * chunk @ centroids.T - centroid_norms, axis=1)
+    return labels
+
+
+class IVFPQIndex:
+    """Inverted-file index with product-quantized residuals over unit vectors.
+
+    Each song sits in the list of its nearest coarse centroid and is stored
+    as ``m`` one-byte codes of its residual from that centroid. A query
+    scans ``nprobe`` lists with a lookup table of ``m x 256`` inner products.
+    It then optionally reranks the best ``k * rerank`` candidates by exact
+    cosine against the full vectors.
+    """
+
+    def __init__(self, centroids, codebooks, list_ptr, list_positions, codes,
+                 vectors=None, nprobe=8, rerank=4):
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.list_ptr = list_ptr
+        self.list_positions = list_positions
+        self.codes = codes
+        self.vectors = vectors
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.m, _, self.dsub = codebooks.shape
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, vectors, n_lists=None, m=16, train_size=100000, seed=42, **kwargs):
+        n, d = vectors.shape
+        if d % m:
+            raise ValueError(f"{d} dimensions cannot be split into {m} subquantizers")
+        n_lists = n_lists or int(min(max(1, 4 * np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n, size=min(train_size, n), replace=False))
+        train = np.asarray(vectors[sample], dtype=np.float32)
+
+        coarse = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3,
+                                 batch_size=4096).fit(train)
+        centroids = coarse.cluster_centers_.astype(np.float32)
+
+        # Product quantizers are trained on residuals from the coarse centroid
+        dsub = d // m
+        residuals = train - centroids[_nearest(train, centroids)]
+        n_codes = min(256, len(train))
+        codebooks = np.zeros((m, 256, dsub), dtype=np.float32)
+        for j in range(m):
+            sub = residuals[:, j * dsub:(j + 1) * dsub]
+            km = KMeans(n_clusters=n_codes, n_init=1, max_iter=50, random_state=seed).fit(sub)
+            codebooks[j, :n_codes] = km.cluster_centers_
+            # Tiny training sets leave slots unused; duplicates of codeword 0
+            # are never chosen over it
+            codebooks[j, n_codes:] = codebooks[j, 0]
+
+        index = cls(centroids, codebooks, None, None, None, **kwargs)
+        index.add(vectors)
+        return index
+
+    def add(self, vectors, chunk_size=65536):
+        """Assign and encode every vector; row positions become the ids."""
+        n = len(vectors)
+        labels = _nearest(vectors, self.centroids, chunk_size)
+        codes = np.empty((n, self.m), dtype=np.uint8)
+        for start in range(0, n, chunk_size):
+            chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+            residual = chunk - self.centroids[labels[start:start + chunk_size]]
+            for j in range(self.m):
+                codes[start:start + chunk_size, j] = _nearest(
+                    residual[:, j * self.dsub:(j + 1) * self.dsub], self.codebooks[j]
+                )
+        order = np.argsort(labels, kind='stable')
+        self.list_positions = order.astype(np.int64)
+        self.codes = codes[order]
+        self.list_ptr = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.n_lists), out=self.list_ptr[1:])
+        if self.vectors is None:
+            self.vectors = vectors
+
+    def search(self, query, k, nprobe=None, rerank=None):
+        """Approximate top-k inner product; returns ``(positions, scores)``."""
+        nprobe = nprobe or self.nprobe
+        rerank = self.rerank if rerank is None else rerank
+        q = np.asarray(query, dtype=np.float32).ravel()
+
+        coarse = self.centroids @ q
+        lut = np.einsum('mcd,md->mc', self.codebooks, q.reshape(self.m, self.dsub))
+        sub = np.arange(self.m)
+
+        positions, scores = [], []
+        for lst in top_k(coarse, nprobe):
+            start, stop = self.list_ptr[lst], self.list_ptr[lst + 1]
+            if start == stop:
+                continue
+            codes = np.asarray(self.codes[start:stop])
+            scores.append(coarse[lst] + lut[sub, codes].sum(axis=1))
+            positions.append(np.asarray(self.list_positions[start:stop]))
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        positions = np.concatenate(positions)
+        scores = np.concatenate(scores)
+
+        if rerank and self.vectors is not None:
+            # Sorted positions keep reads from the mapped vectors sequential
+            shortlist = np.sort(positions[top_k(scores, k * rerank)])
+            exact = np.asarray(self.vectors[shortlist], dtype=np.float32) @ q
+            best = top_k(exact, k)
+            return shortlist[best], exact[best]
+        best = top_k(scores, k)
+        return positions[best], scores[best]
+
+    def save(self, path, meta=None):
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, 'centroids.npy'), self.centroids)
+        np.save(os.path.join(tmp_path, 'codebooks.npy'), self.codebooks)
+        np.save(os.path.join(tmp_path, 'list_ptr.npy'), self.list_ptr)
+        np.save(os.path.join(tmp_path, 'list_positions.npy'), self.list_positions)
+        np.save(os.path.join(tmp_path, 'codes.npy'), self.codes)
+        meta = dict(meta or {}, nprobe=self.nprobe, rerank=self.rerank,
+                    n_lists=self.n_lists, m=self.m, created_at=time.strftime('%Y-%m-%dT%H:%M:%S%z'))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, vectors=None, **kwargs):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        kwargs.setdefault('nprobe', meta['nprobe'])
+        kwargs.setdefault('rerank', meta['rerank'])
+        index = cls(
+            centroids=np.load(os.path.join(path, 'centroids.npy')),
+            codebooks=np.load(os.path.join(path, 'codebooks.npy')),
+            list_ptr=np.load(os.path.join(path, 'list_ptr.npy')),
+            list_positions=np.load(os.path.join(path, 'list_positions.npy'), mmap_mode='r'),
+            codes=np.load(os.path.join(path, 'codes.npy'), mmap_mode='r'),
+            vectors=vectors,
+            **kwargs
+        )
+        index.meta = meta
+        return index
+
+
+def save_ann_index(index, embeddings, root=ANN_DIR):
+    """Save under ``root/<embeddings version>-ivf<lists>-pq<m>/`` and publish it."""
+    version = f"{embeddings.version}-ivf{index.n_lists}-pq{index.m}"
+    index.save(os.path.join(root, version), meta={
+        'version': version,
+        'embeddings_version': embeddings.version,
+    })
+    publish_version(root, version)
+    return version
+
+
+def load_ann_index(embeddings, version=None, root=ANN_DIR, **kwargs):
+    """Map the current index and check it was built from ``embeddings``."""
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No ANN index published in {root}; run build_ann_index.py first")
+    index = IVFPQIndex.load(os.path.join(root, version), vectors=embeddings.vectors, **kwargs)
+    if index.meta['embeddings_version'] != embeddings.version:
+        raise ValueError(
+            f"ANN index {version} was built from embeddings {index.meta['embeddings_version']}, "
+            f"not {embeddings.version}; rerun build_ann_index.py"
+        )
+    return index
+
+
+def iter_ann_topk(index, k=10, min_score=0.0, nprobe=None, block_size=1000):
+    """Yield (sources, neighbours, scores) blocks like ``similarity.iter_topk``."""
+    n = len(index.vectors)
+    for start in range(0, n, block_size):
+        sources, neighbours, scores = [], [], []
+        for position in range(start, min(start + block_size, n)):
+            # One extra result because a song finds itself
+            found, found_scores = index.search(index.vectors[position], k + 1, nprobe=nprobe)
+            keep = (found != position) & (found_scores > min_score)
+            found, found_scores = found[keep][:k], found_scores[keep][:k]
+            sources.append(np.full(len(found), position, dtype=np.int64))
+            neighbours.append(found)
+            scores.append(found_scores)
+        yield np.concatenate(sources), np.concatenate(neighbours), np.concatenate(scores)
+
+
+def evaluate_recall(index, vectors, sample, k=10, nprobe=None):
+    """Recall@k against exact cosine and mean query latency for ``sample`` rows."""
+    queries = np.asarray(vectors[sample], dtype=np.float32)
+    recalls = []
+    elapsed = 0.0
+    for row, position in enumerate(sample):
+        exact = np.asarray(vectors @ queries[row])
+        exact[position] = -np.inf
+        expected = set(top_k(exact, k).tolist())
+
+        start_time = time.perf_counter()
+        found, _ = index.search(queries[row], k + 1, nprobe=nprobe)
+        elapsed += time.perf_counter() - start_time
+        found = [p for p in found.tolist() if p != position][:k]
+        recalls.append(len(expected.intersection(found)) / max(len(expected), 1))
+    return float(np.mean(recalls)), elapsed / max(len(sample), 1)
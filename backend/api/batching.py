@@ -0,0 +1,112 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item calls into batched calls of ``batch_fn``.
+
+    Callers from any thread (WSGI workers, or the per-request threads the
+    ASGI handler runs sync views in) put an item on a queue and wait on a
+    future. One worker thread takes the first waiting item, gathers more
+    for up to ``max_wait_ms`` or until ``max_batch_size`` items, runs
+    ``batch_fn(items)`` once and hands each caller its result.
+    ``batch_fn`` must return one result per item, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._sizes = Counter()
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        self._max_depth = 0
+
+    def _ensure_worker(self):
+        # The thread is started on first use and again after a fork, since
+        # a forked worker process does not inherit it
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Queue ``item`` and return a future for its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _gather(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._gather()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: got {len(results)} results for {len(items)} items")
+            except Exception as e:
+                self._errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            finished = time.perf_counter()
+
+            self._batches += 1
+            self._items += len(batch)
+            self._sizes[len(batch)] += 1
+            self._wait_seconds += sum(started - queued for _, _, queued in batch)
+            self._run_seconds += finished - started
+
+    def stats(self):
+        batches = max(self._batches, 1)
+        items = max(self._items, 1)
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': self._max_depth,
+            'batches': self._batches,
+            'items': self._items,
+            'errors': self._errors,
+            'mean_batch_size': self._items / batches,
+            'batch_sizes': dict(sorted(self._sizes.items())),
+            'mean_queue_wait_ms': 1000 * self._wait_seconds / items,
+            'mean_batch_ms': 1000 * self._run_seconds / batches,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
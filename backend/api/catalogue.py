@@ -0,0 +1,82 @@
+import unicodedata
+
+CATALOGUE_TABLE = 'artist_catalogue'
+CATALOGUE_META_TABLE = 'artist_catalogue_meta'
+
+
+def normalize_artist(name):
+    """Case- and accent-insensitive form used for prefix lookups ("Beyoncé" -> "beyonce")."""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+def build_artist_catalogue(conn):
+    """Materialize one row per artist with its song count, then swap it in.
+
+    ``conn`` is a sqlite3 connection (the importer's, or Django's raw
+    connection). Returns the number of artists.
+    """
+    rows = conn.execute(
+        "SELECT artist, COUNT(*) FROM lyrics WHERE artist IS NOT NULL GROUP BY artist"
+    ).fetchall()
+
+    conn.execute(f"DROP TABLE IF EXISTS {CATALOGUE_TABLE}_new")
+    conn.execute(f"""
+        CREATE TABLE {CATALOGUE_TABLE}_new (
+            artist TEXT PRIMARY KEY,
+            normalized TEXT NOT NULL,
+            song_count INTEGER NOT NULL
+        )
+    """)
+    conn.executemany(
+        f"INSERT INTO {CATALOGUE_TABLE}_new (artist, normalized, song_count) VALUES (?, ?, ?)",
+        [(artist, normalize_artist(artist), count) for artist, count in rows]
+    )
+    conn.execute(f"DROP TABLE IF EXISTS {CATALOGUE_TABLE}")
+    conn.execute(f"ALTER TABLE {CATALOGUE_TABLE}_new RENAME TO {CATALOGUE_TABLE}")
+    conn.execute(f"CREATE INDEX idx_{CATALOGUE_TABLE}_normalized ON {CATALOGUE_TABLE} (normalized)")
+
+    # The version feeds the artists endpoint's ETag and the list count
+    # caches; a counter bumped on every rebuild, so two builds never share one
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {CATALOGUE_META_TABLE} (version TEXT NOT NULL)")
+    previous = conn.execute(f"SELECT version FROM {CATALOGUE_META_TABLE}").fetchone()
+    try:
+        build = int(previous[0]) + 1 if previous else 1
+    except ValueError:
+        # A timestamp version from before the counter
+        build = 1
+    conn.execute(f"DELETE FROM {CATALOGUE_META_TABLE}")
+    conn.execute(f"INSERT INTO {CATALOGUE_META_TABLE} (version) VALUES (?)", (str(build),))
+    return len(rows)
+
+
+def catalogue_version(cursor):
+    """Current catalogue version, or None when it has not been built."""
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [CATALOGUE_META_TABLE]
+    )
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute(f"SELECT version FROM {CATALOGUE_META_TABLE}")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def search_artists(cursor, prefix=None, limit=None):
+    """Artists whose normalized name starts with ``prefix``, most songs first."""
+    sql = f"SELECT artist, song_count FROM {CATALOGUE_TABLE}"
+    params = []
+    if prefix:
+        # A range on the normalized index instead of LIKE, which could not use it
+        normalized = normalize_artist(prefix)
+        sql += " WHERE normalized >= %s AND normalized < %s"
+        params += [normalized, normalized + '\U0010ffff']
+        sql += " ORDER BY song_count DESC, artist"
+    else:
+        sql += " ORDER BY artist"
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    cursor.execute(sql, params)
+    return [{'artist': artist, 'song_count': count} for artist, count in cursor.fetchall()]
@@ -0,0 +1,391 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from django.db import connection, transaction
+from joblib import Parallel, delayed
+from sklearn.cluster import MiniBatchKMeans
+
+from .embeddings import load_embeddings
+from .tfidf_artifact import ARTIFACT_DIR, current_version, publish_version
+
+# One directory per fit, ``<tfidf version>-<timestamp>``, with a CURRENT
+# pointer like the TF-IDF artifacts; published directories are never rewritten
+CLUSTERS_DIR = os.path.join(ARTIFACT_DIR, 'clusters')
+
+# Materialized from lyrics.cluster_label: members numbered 0..n-1 per
+# cluster, so a uniform sample is a handful of primary-key lookups
+CLUSTER_MEMBERS_TABLE = 'cluster_members'
+CLUSTER_SUMMARY_TABLE = 'cluster_summary'
+
+
+def _fit_one(X, n_clusters, batch_size, max_iter, seed):
+    return MiniBatchKMeans(
+        n_clusters=n_clusters,
+        batch_size=batch_size,
+        max_iter=max_iter,
+        n_init=1,
+        random_state=seed,
+    ).fit(X)
+
+
+def fit_minibatch_kmeans(X, n_clusters, n_init=8, batch_size=4096, max_iter=100, seed=42, n_jobs=-1):
+    """MiniBatchKMeans with its ``n_init`` restarts run in parallel.
+
+    Each restart is an independent single-init fit with its own seed; the
+    one with the lowest inertia over the full matrix is returned.
+    """
+    # joblib memory-maps the matrix into the worker processes rather than copying it
+    models = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_one)(X, n_clusters, batch_size, max_iter, seed + i) for i in range(n_init)
+    )
+    return min(models, key=lambda model: model.inertia_)
+
+
+def fit_streaming_kmeans(X, n_clusters, chunk_size=20000, epochs=3, batch_size=4096, seed=42):
+    """Fit with partial_fit over row chunks, so each step reads one chunk of rows.
+
+    Works on the memory-mapped store without loading the whole matrix;
+    chunks are visited in a new random order each epoch.
+    """
+    rng = np.random.default_rng(seed)
+    model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=seed)
+    starts = np.arange(0, X.shape[0], chunk_size)
+    for _ in range(epochs):
+        for start in rng.permutation(starts):
+            chunk = X[start:start + chunk_size]
+            if chunk.shape[0] < n_clusters and not hasattr(model, 'cluster_centers_'):
+                # The first partial_fit needs at least one row per cluster
+                continue
+            model.partial_fit(chunk)
+    return model
+
+
+def predict_in_chunks(model, X, chunk_size=50000):
+    """Labels and each row's squared distance to its centre (they sum to the inertia).
+
+    ``model`` is a ``ClusterModel`` and ``X`` rows already in its space, so
+    these distances are directly comparable with ``ClusterModel.assign``'s.
+    """
+    labels = np.empty(X.shape[0], dtype=np.int32)
+    sq_distances = np.empty(X.shape[0], dtype=np.float64)
+    for start in range(0, X.shape[0], chunk_size):
+        chunk_labels, chunk_distances = model.nearest(X[start:start + chunk_size])
+        labels[start:start + chunk_size] = chunk_labels
+        sq_distances[start:start + chunk_size] = chunk_distances
+    return labels, sq_distances
+
+
+def nearest_per_cluster(ids, labels, sq_distances, representatives=None):
+    """``{cluster: (lyric_id, squared distance)}`` of the song closest to each centroid.
+
+    Pass the current ``representatives`` to only replace those that a
+    newly labelled song beats.
+    """
+    representatives = dict(representatives or {})
+    for lyric_id, label, distance in zip(np.asarray(ids).tolist(), np.asarray(labels).tolist(),
+                                         np.asarray(sq_distances).tolist()):
+        current = representatives.get(label)
+        if current is None or distance < current[1]:
+            representatives[label] = (lyric_id, distance)
+    return representatives
+
+
+def ensure_cluster_column():
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA table_info(lyrics)")
+        if 'cluster_label' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE lyrics ADD COLUMN cluster_label INTEGER DEFAULT NULL")
+
+
+def write_cluster_labels(ids, labels):
+    """Set lyrics.cluster_label for every id in one transaction.
+
+    Labels are bulk-inserted into a temp table and applied with a single
+    UPDATE joined on it, instead of one UPDATE per song.
+    """
+    ensure_cluster_column()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS temp.cluster_assignments")
+        cursor.execute("""
+            CREATE TEMP TABLE cluster_assignments (
+                id INTEGER PRIMARY KEY,
+                cluster_label INTEGER NOT NULL
+            )
+        """)
+        cursor.executemany(
+            "INSERT INTO temp.cluster_assignments (id, cluster_label) VALUES (%s, %s)",
+            zip(np.asarray(ids).tolist(), np.asarray(labels).tolist())
+        )
+        cursor.execute("""
+            UPDATE lyrics
+            SET cluster_label = (
+                SELECT a.cluster_label FROM temp.cluster_assignments a WHERE a.id = lyrics.id
+            )
+            WHERE id IN (SELECT id FROM temp.cluster_assignments)
+        """)
+        updated = cursor.rowcount
+        cursor.execute("DROP TABLE temp.cluster_assignments")
+    return updated
+
+
+def build_cluster_tables(top_terms, representatives):
+    """Rebuild cluster_members and cluster_summary from lyrics.cluster_label.
+
+    ``top_terms[c]`` and ``representatives`` (see nearest_per_cluster())
+    are stored in the summary with each cluster's song count. Both tables
+    are built under new names and swapped in within one transaction.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {CLUSTER_MEMBERS_TABLE}_new")
+        cursor.execute(f"""
+            CREATE TABLE {CLUSTER_MEMBERS_TABLE}_new (
+                cluster_label INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                lyric_id INTEGER NOT NULL,
+                PRIMARY KEY (cluster_label, position)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute(f"""
+            INSERT INTO {CLUSTER_MEMBERS_TABLE}_new (cluster_label, position, lyric_id)
+            SELECT cluster_label, ROW_NUMBER() OVER (PARTITION BY cluster_label ORDER BY id) - 1, id
+            FROM lyrics
+            WHERE cluster_label IS NOT NULL
+        """)
+
+        cursor.execute(f"DROP TABLE IF EXISTS {CLUSTER_SUMMARY_TABLE}_new")
+        cursor.execute(f"""
+            CREATE TABLE {CLUSTER_SUMMARY_TABLE}_new (
+                cluster_label INTEGER PRIMARY KEY,
+                song_count INTEGER NOT NULL,
+                top_terms TEXT NOT NULL,
+                representative_id INTEGER,
+                representative_distance REAL
+            )
+        """)
+        cursor.execute(f"""
+            SELECT cluster_label, COUNT(*) FROM {CLUSTER_MEMBERS_TABLE}_new GROUP BY cluster_label
+        """)
+        counts = cursor.fetchall()
+        cursor.executemany(
+            f"INSERT INTO {CLUSTER_SUMMARY_TABLE}_new VALUES (%s, %s, %s, %s, %s)",
+            [
+                (
+                    label,
+                    count,
+                    json.dumps(top_terms[label] if label < len(top_terms) else []),
+                    *representatives.get(label, (None, None)),
+                )
+                for label, count in counts
+            ]
+        )
+
+        for table in (CLUSTER_MEMBERS_TABLE, CLUSTER_SUMMARY_TABLE):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    return dict(counts)
+
+
+def load_cluster_summary():
+    """``{cluster: summary row}``, or None before build_cluster_tables() has run."""
+    with connection.cursor() as cursor:
+        if CLUSTER_SUMMARY_TABLE not in connection.introspection.table_names(cursor):
+            return None
+        cursor.execute(f"""
+            SELECT s.cluster_label, s.song_count, s.top_terms, s.representative_id,
+                   s.representative_distance, l.artist, l.title
+            FROM {CLUSTER_SUMMARY_TABLE} s
+            LEFT JOIN lyrics l ON l.id = s.representative_id
+            ORDER BY s.cluster_label
+        """)
+        return {
+            label: {
+                'cluster_label': label,
+                'count': count,
+                'top_terms': json.loads(top_terms),
+                'representative': (
+                    {'id': rep_id, 'artist': artist, 'title': title, 'distance': distance}
+                    if rep_id is not None else None
+                ),
+            }
+            for label, count, top_terms, rep_id, distance, artist, title in cursor.fetchall()
+        }
+
+
+def sample_cluster(cluster_label, song_count, k, rng=random):
+    """Lyric ids of ``k`` songs drawn uniformly from the whole cluster.
+
+    Costs O(k): random positions, each one primary-key lookup.
+    """
+    positions = rng.sample(range(song_count), min(k, song_count))
+    if not positions:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT lyric_id FROM {CLUSTER_MEMBERS_TABLE}
+            WHERE cluster_label = %s AND position IN ({', '.join(['%s'] * len(positions))})
+        """, [cluster_label, *positions])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class ClusterModel:
+    """Fitted cluster centroids, kept so new texts can be labelled without refitting.
+
+    ``space`` is ``'tfidf'`` when the centroids live in the artifact's
+    TF-IDF space, or ``'embeddings'`` when they were fitted on the LSA
+    vectors of ``embeddings``. ``top_terms[c]`` are the heaviest terms of
+    centroid ``c``.
+    """
+
+    def __init__(self, centroids, space, top_terms, tfidf_version, embeddings=None, sizes=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.space = space
+        self.top_terms = top_terms
+        self.tfidf_version = tfidf_version
+        self.embeddings = embeddings
+        self.sizes = sizes
+        # Published cluster version, set once saved or loaded
+        self.version = None
+        self._sq_norms = (self.centroids.astype(np.float64) ** 2).sum(axis=1)
+
+    @property
+    def n_clusters(self):
+        return self.centroids.shape[0]
+
+    def project(self, tfidf_rows):
+        """TF-IDF rows in the centroids' space."""
+        if self.space == 'embeddings':
+            return self.embeddings.transform(tfidf_rows)
+        return tfidf_rows
+
+    def _sq_distances(self, X):
+        # One (sparse-)dense product gives every row-centroid dot product;
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2 does the rest
+        if sp.issparse(X):
+            row_sq_norms = np.asarray(X.multiply(X).sum(axis=1)).ravel()
+        else:
+            row_sq_norms = (np.asarray(X, dtype=np.float64) ** 2).sum(axis=1)
+        distances = self._sq_norms - 2 * np.asarray(X @ self.centroids.T, dtype=np.float64)
+        return distances + row_sq_norms[:, None]
+
+    def nearest(self, X):
+        """Nearest centroid for rows already in the centroids' space: ``(labels, squared distances)``."""
+        distances = self._sq_distances(X)
+        labels = distances.argmin(axis=1)
+        return labels, np.maximum(distances[np.arange(len(labels)), labels], 0.0)
+
+    def assign(self, tfidf_rows):
+        """Nearest centroid for each TF-IDF row: ``(labels, squared distances)``.
+
+        Embedding-space models project the rows exactly as the stored
+        vectors were, so distances match those of ``predict_in_chunks``.
+        """
+        return self.nearest(self.project(tfidf_rows))
+
+    def distances_to(self, tfidf_rows, labels):
+        """Squared distance of each TF-IDF row to the centroid of its given label."""
+        distances = self._sq_distances(self.project(tfidf_rows))
+        return np.maximum(distances[np.arange(len(labels)), np.asarray(labels)], 0.0)
+
+
+def centroid_top_terms(centroids, feature_names, n_terms=15, components=None):
+    """Heaviest terms per centroid; LSA centroids are projected back onto the terms first."""
+    weights = np.asarray(centroids, dtype=np.float32)
+    if components is not None:
+        weights = weights @ components
+    return [
+        [feature_names[j] for j in np.argsort(-row)[:n_terms]]
+        for row in weights
+    ]
+
+
+def save_cluster_model(model, artifact, root=CLUSTERS_DIR):
+    """Write ``root/<version>/`` and publish it as the current clusters."""
+    version = f"{artifact.version}-{time.strftime('%Y%m%d-%H%M%S')}"
+    path = os.path.join(root, version)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'centroids.npy'), model.centroids)
+    meta = {
+        'version': version,
+        'tfidf_version': artifact.version,
+        'space': model.space,
+        'embeddings_version': model.embeddings.version if model.embeddings is not None else None,
+        'n_clusters': model.n_clusters,
+        'sizes': model.sizes,
+        'top_terms': model.top_terms,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    publish_version(root, version)
+    model.version = version
+    return path
+
+
+def load_cluster_model(artifact, version=None, root=CLUSTERS_DIR):
+    """Load the current clusters (or ``version``), which must be fitted on ``artifact``."""
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No clusters published in {root}; run cluster_lyrics.py first")
+    path = os.path.join(root, version)
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta['tfidf_version'] != artifact.version:
+        raise FileNotFoundError(
+            f"Clusters {version} were fitted on TF-IDF artifact {meta['tfidf_version']}, "
+            f"not {artifact.version}; rerun cluster_lyrics.py"
+        )
+    embeddings = None
+    if meta['space'] == 'embeddings':
+        embeddings = load_embeddings(meta['embeddings_version'], tfidf_version=artifact.version)
+    model = ClusterModel(
+        np.load(os.path.join(path, 'centroids.npy')),
+        meta['space'],
+        meta['top_terms'],
+        meta['tfidf_version'],
+        embeddings=embeddings,
+        sizes=meta.get('sizes'),
+    )
+    model.version = version
+    return model
+
+
+_cluster_model = None
+_cluster_model_lock = threading.Lock()
+_cluster_last_check = 0.0
+
+
+def get_cluster_model():
+    """Clusters of the artifact this worker's recommendation index is serving.
+
+    Reloaded when the index moves to a newly published artifact, or when
+    cluster_lyrics.py publishes new clusters; like the index, the pointer
+    is checked at most every ``RECOMMENDER_RELOAD_CHECK_SECONDS``.
+    """
+    from .recommender import get_recommendation_index
+
+    global _cluster_model, _cluster_last_check
+    artifact = get_recommendation_index().artifact
+    now = time.monotonic()
+    interval = getattr(settings, 'RECOMMENDER_RELOAD_CHECK_SECONDS', 5)
+    if (_cluster_model is not None and _cluster_model.tfidf_version == artifact.version
+            and now - _cluster_last_check < interval):
+        return artifact, _cluster_model
+
+    with _cluster_model_lock:
+        _cluster_last_check = now
+        version = current_version(CLUSTERS_DIR)
+        if (_cluster_model is None or _cluster_model.tfidf_version != artifact.version
+                or (version is not None and version != _cluster_model.version)):
+            _cluster_model = load_cluster_model(artifact, version)
+    return artifact, _cluster_model
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from .tfidf_artifact import ARTIFACT_DIR, current_version, publish_version
+
+EMBEDDINGS_DIR = os.path.join(ARTIFACT_DIR, 'embeddings')
+
+
+class SongEmbeddings:
+    """Dense, L2-normalised LSA vectors for every song in a TF-IDF artifact.
+
+    ``vectors[i]`` belongs to lyric ``ids[i]``. ``components`` projects
+    TF-IDF rows (songs or queries) into the same space.
+    """
+
+    def __init__(self, ids, vectors, components, tfidf_version, version=None, path=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.components = components
+        self.tfidf_version = tfidf_version
+        self.version = version
+        self.path = path
+        self._positions = None
+
+    @property
+    def n_components(self):
+        return self.vectors.shape[1]
+
+    def position(self, lyric_id):
+        if self._positions is None:
+            self._positions = {int(lyric_id): i for i, lyric_id in enumerate(self.ids)}
+        return self._positions[int(lyric_id)]
+
+    def vector(self, lyric_id):
+        return self.vectors[self.position(lyric_id)]
+
+    def transform(self, tfidf_rows):
+        """Project TF-IDF rows and normalise them like the stored vectors."""
+        projected = np.asarray(tfidf_rows @ self.components.T, dtype=np.float32)
+        return normalize(projected, copy=False)
+
+
+def fit_embeddings(artifact, n_components=256, n_iter=5, seed=42):
+    """Reduce the artifact's TF-IDF matrix with randomized truncated SVD."""
+    svd = TruncatedSVD(n_components=n_components, algorithm='randomized',
+                       n_iter=n_iter, random_state=seed)
+    vectors = svd.fit_transform(artifact.matrix).astype(np.float32)
+    embeddings = SongEmbeddings(
+        ids=np.asarray(artifact.ids, dtype=np.int64),
+        vectors=normalize(vectors, copy=False),
+        components=svd.components_.astype(np.float32),
+        tfidf_version=artifact.version,
+    )
+    embeddings.explained_variance = float(svd.explained_variance_ratio_.sum())
+    return embeddings
+
+
+def save_embeddings(embeddings, root=EMBEDDINGS_DIR):
+    """Write ``root/<tfidf version>-lsa<dims>/`` and publish it as current."""
+    version = f"{embeddings.tfidf_version}-lsa{embeddings.n_components}"
+    final_path = os.path.join(root, version)
+    tmp_path = final_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, 'ids.npy'), embeddings.ids)
+    np.save(os.path.join(tmp_path, 'vectors.npy'), embeddings.vectors)
+    np.save(os.path.join(tmp_path, 'components.npy'), embeddings.components)
+    meta = {
+        'version': version,
+        'tfidf_version': embeddings.tfidf_version,
+        'n_components': embeddings.n_components,
+        'n_documents': int(embeddings.vectors.shape[0]),
+        'explained_variance': getattr(embeddings, 'explained_variance', None),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.replace(tmp_path, final_path)
+    publish_version(root, version)
+
+    embeddings.version = version
+    embeddings.path = final_path
+    return version
+
+
+def load_embeddings(version=None, root=EMBEDDINGS_DIR, tfidf_version=None):
+    """Map saved embeddings, by default the current ones.
+
+    Pass ``tfidf_version`` to make sure the embeddings were built from the
+    TF-IDF artifact the caller is using.
+    """
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(
+            f"No embeddings published in {root}; run compute_embeddings.py first"
+        )
+    path = os.path.join(root, version)
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if tfidf_version is not None and meta['tfidf_version'] != tfidf_version:
+        raise ValueError(
+            f"Embeddings {version} were built from TF-IDF artifact {meta['tfidf_version']}, "
+            f"not {tfidf_version}; rerun compute_embeddings.py"
+        )
+
+    return SongEmbeddings(
+        ids=np.load(os.path.join(path, 'ids.npy'), mmap_mode='r'),
+        vectors=np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r'),
+        components=np.load(os.path.join(path, 'components.npy')),
+        tfidf_version=meta['tfidf_version'],
+        version=version,
+        path=path,
+    )
@@ -0,0 +1,212 @@
+import json
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+# On-disk layout of a feature store directory. Every array is a raw
+# little-endian binary file so it can be memory-mapped without parsing.
+META_FILE = 'features.json'
+IDS_FILE = 'ids.bin'
+INDPTR_FILE = 'indptr.bin'
+INDICES_FILE = 'indices.bin'
+DATA_FILE = 'data.bin'
+VOCAB_FILE = 'vocab.bin'
+VOCAB_OFFSETS_FILE = 'vocab_offsets.bin'
+
+IDS_DTYPE = np.dtype('<i8')
+INDICES_DTYPE = np.dtype('<i4')
+DATA_DTYPE = np.dtype('<f4')
+OFFSETS_DTYPE = np.dtype('<i8')
+
+
+def _map(path, dtype, count):
+    # np.memmap refuses empty files
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class FeatureStoreWriter:
+    """Append CSR rows to a feature store without materializing the whole matrix.
+
+    Usage::
+
+        with FeatureStoreWriter(path, feature_names) as writer:
+            for ids, block in blocks:
+                writer.write_rows(ids, block)
+    """
+
+    def __init__(self, path, feature_names):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.n_features = len(feature_names)
+        self._write_vocabulary(feature_names)
+        self._ids = open(os.path.join(path, IDS_FILE), 'wb')
+        self._indices = open(os.path.join(path, INDICES_FILE), 'wb')
+        self._data = open(os.path.join(path, DATA_FILE), 'wb')
+        # Row pointers are tiny next to the data, so keep them until close
+        # and pick the narrowest index dtype once nnz is known
+        self._indptr = [np.zeros(1, dtype=np.int64)]
+        self.n_rows = 0
+        self.nnz = 0
+
+    def _write_vocabulary(self, feature_names):
+        # Interned vocabulary: one UTF-8 blob plus an offsets array, so term j
+        # is blob[offsets[j]:offsets[j + 1]] and nothing is parsed at load time
+        encoded = [str(term).encode('utf-8') for term in feature_names]
+        offsets = np.zeros(len(encoded) + 1, dtype=OFFSETS_DTYPE)
+        np.cumsum([len(term) for term in encoded], out=offsets[1:])
+        with open(os.path.join(self.path, VOCAB_FILE), 'wb') as f:
+            f.write(b''.join(encoded))
+        offsets.tofile(os.path.join(self.path, VOCAB_OFFSETS_FILE))
+
+    def write_rows(self, ids, block):
+        """Append a block of CSR rows belonging to lyric ``ids``."""
+        block = sp.csr_matrix(block)
+        if block.shape[1] != self.n_features:
+            raise ValueError(
+                f"Block has {block.shape[1]} features, store expects {self.n_features}"
+            )
+        block.sort_indices()
+        ids = np.asarray(ids, dtype=IDS_DTYPE)
+        if len(ids) != block.shape[0]:
+            raise ValueError(f"Got {len(ids)} ids for {block.shape[0]} rows")
+
+        ids.tofile(self._ids)
+        block.indices.astype(INDICES_DTYPE, copy=False).tofile(self._indices)
+        block.data.astype(DATA_DTYPE, copy=False).tofile(self._data)
+        self._indptr.append(block.indptr[1:].astype(np.int64) + self.nnz)
+        self.n_rows += block.shape[0]
+        self.nnz += block.nnz
+
+    def close(self):
+        if self._ids.closed:
+            return
+        for f in (self._ids, self._indices, self._data):
+            f.close()
+
+        indptr_dtype = np.dtype('<i4') if self.nnz < 2**31 else np.dtype('<i8')
+        np.concatenate(self._indptr).astype(indptr_dtype).tofile(
+            os.path.join(self.path, INDPTR_FILE)
+        )
+        meta = {
+            'n_rows': self.n_rows,
+            'n_features': self.n_features,
+            'nnz': self.nnz,
+            'indptr_dtype': indptr_dtype.str,
+        }
+        with open(os.path.join(self.path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_feature_store(path, ids, matrix, feature_names, block_size=10000):
+    """Stream an in-memory CSR matrix into a feature store in row blocks."""
+    matrix = sp.csr_matrix(matrix)
+    ids = np.asarray(ids)
+    with FeatureStoreWriter(path, feature_names) as writer:
+        for start in range(0, matrix.shape[0], block_size):
+            stop = start + block_size
+            writer.write_rows(ids[start:stop], matrix[start:stop])
+    return writer
+
+
+class FeatureStore:
+    """Read-only, memory-mapped view of a feature store.
+
+    Opening a store only maps files; pages are read lazily by the OS and
+    shared between every process that maps the same store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.n_rows = meta['n_rows']
+        self.n_features = meta['n_features']
+        self.nnz = meta['nnz']
+
+        self.ids = _map(os.path.join(path, IDS_FILE), IDS_DTYPE, self.n_rows)
+        self.indptr = _map(os.path.join(path, INDPTR_FILE),
+                           np.dtype(meta['indptr_dtype']), self.n_rows + 1)
+        self.indices = _map(os.path.join(path, INDICES_FILE), INDICES_DTYPE, self.nnz)
+        self.data = _map(os.path.join(path, DATA_FILE), DATA_DTYPE, self.nnz)
+        self._vocab = _map(os.path.join(path, VOCAB_FILE), np.uint8,
+                           os.path.getsize(os.path.join(path, VOCAB_FILE)))
+        self._vocab_offsets = _map(os.path.join(path, VOCAB_OFFSETS_FILE),
+                                   OFFSETS_DTYPE, self.n_features + 1)
+
+        self._matrix = None
+        self._positions = None
+        self._feature_names = None
+        self._term_index = None
+
+    @property
+    def matrix(self):
+        """The whole store as a CSR matrix backed by the mapped arrays."""
+        if self._matrix is None:
+            self._matrix = sp.csr_matrix(
+                (self.data, self.indices, self.indptr),
+                shape=(self.n_rows, self.n_features),
+                copy=False,
+            )
+        return self._matrix
+
+    def position(self, lyric_id):
+        """Row position of ``lyric_id``; raises KeyError if it is not stored."""
+        if self._positions is None:
+            self._positions = {int(lyric_id): i for i, lyric_id in enumerate(self.ids)}
+        return self._positions[int(lyric_id)]
+
+    def row_slice(self, position):
+        """Column indices and values of one row, as views into the mapping."""
+        start, stop = int(self.indptr[position]), int(self.indptr[position + 1])
+        return self.indices[start:stop], self.data[start:stop]
+
+    def vector(self, lyric_id):
+        """One song's vector as a 1 x n_features CSR matrix sharing the mapping."""
+        indices, data = self.row_slice(self.position(lyric_id))
+        indptr = np.array([0, len(indices)], dtype=indices.dtype)
+        return sp.csr_matrix((data, indices, indptr), shape=(1, self.n_features), copy=False)
+
+    def features(self, lyric_id):
+        """``{feature_name: tfidf_value}`` for one song, like the old tfidf_features rows."""
+        indices, data = self.row_slice(self.position(lyric_id))
+        return {self.term(j): float(v) for j, v in zip(indices.tolist(), data.tolist())}
+
+    def term(self, j):
+        start, stop = int(self._vocab_offsets[j]), int(self._vocab_offsets[j + 1])
+        return bytes(self._vocab[start:stop]).decode('utf-8')
+
+    @property
+    def feature_names(self):
+        if self._feature_names is None:
+            blob = bytes(self._vocab).decode('utf-8')
+            # Offsets are in bytes; terms are ASCII after cleaning but decode
+            # per term if anything wider slipped in
+            if len(blob) == len(self._vocab):
+                offsets = self._vocab_offsets.tolist()
+                self._feature_names = [blob[offsets[j]:offsets[j + 1]]
+                                       for j in range(self.n_features)]
+            else:
+                self._feature_names = [self.term(j) for j in range(self.n_features)]
+        return self._feature_names
+
+    def term_index(self, term):
+        """Column of ``term``; raises KeyError if it is not in the vocabulary."""
+        if self._term_index is None:
+            self._term_index = {name: j for j, name in enumerate(self.feature_names)}
+        return self._term_index[term]
+
+    def disk_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in (META_FILE, IDS_FILE, INDPTR_FILE, INDICES_FILE,
+                         DATA_FILE, VOCAB_FILE, VOCAB_OFFSETS_FILE)
+        )
@@ -0,0 +1,311 @@
+import csv
+import gzip
+import os
+import sqlite3
+import sys
+import time
+
+from .catalogue import build_artist_catalogue
+from .search import SEARCH_TABLE, install_search_index
+
+STAGING_TABLE = 'lyrics_staging'
+CHECKPOINT_TABLE = 'import_checkpoint'
+LYRICS_ARTIST_INDEX = 'idx_lyrics_artist_title'
+
+# Columns the staging table itself fills; anything else on ``lyrics`` is
+# derived by a later stage and carried over from the live table
+STAGING_COLUMNS = ('id', 'artist', 'title', 'lyric', 'dedupe_key')
+DERIVED_COLUMNS = [('clean_lyrics', 'TEXT'), ('clean_hash', 'TEXT'), ('cluster_label', 'INTEGER')]
+# Only meaningful while the lyric text is unchanged (clean_hash already
+# makes clean_lyrics.py redo changed rows)
+LYRIC_BOUND_COLUMNS = ('cluster_label',)
+
+# Tables keyed by lyric id, and the columns holding it
+ID_KEYED_TABLES = {
+    'lyric_sentiments': ('lyric_id',),
+    'song_similarities': ('song_id1', 'song_id2'),
+    'song_neighbours': ('song_id', 'neighbour_id'),
+}
+CLUSTER_TABLES = ('cluster_members', 'cluster_summary')
+
+# Lyrics can be far longer than csv's 128 KiB default field limit
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+
+def open_csv(path):
+    """Open a CSV file for reading, transparently decompressing .gz input."""
+    with open(path, 'rb') as f:
+        is_gzip = f.read(2) == b'\x1f\x8b'
+    if is_gzip:
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def source_signature(path):
+    # A checkpoint is only reused for the very same input file
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def dedupe_key(artist, title):
+    return f"{(artist or '').strip().lower()}\x1f{(title or '').strip().lower()}"
+
+
+def configure_bulk_load(conn, cache_mb=512):
+    """PRAGMAs for a large one-off load; WAL keeps readers working meanwhile."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_mb) * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+def prepare_staging(conn, signature, restart=False):
+    """Create the staging table and return how many CSV rows were already loaded."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            source TEXT PRIMARY KEY,
+            rows_read INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    row = conn.execute(
+        f"SELECT rows_read FROM {CHECKPOINT_TABLE} WHERE source = ?", (signature,)
+    ).fetchone()
+    staging_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (STAGING_TABLE,)
+    ).fetchone()
+
+    if restart or row is None or not staging_exists:
+        # A different file (or no checkpoint) means starting over
+        conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        conn.execute(f"DELETE FROM {CHECKPOINT_TABLE}")
+        conn.execute(f"""
+            CREATE TABLE {STAGING_TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                artist TEXT,
+                title TEXT,
+                lyric TEXT,
+                dedupe_key TEXT NOT NULL
+            )
+        """)
+        conn.execute(
+            f"CREATE UNIQUE INDEX idx_{STAGING_TABLE}_dedupe ON {STAGING_TABLE} (dedupe_key)"
+        )
+        return 0
+    return row[0]
+
+
+def table_columns(conn, table):
+    """``[(name, declared type), ...]`` for ``table``, empty when it does not exist."""
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def map_existing_ids(conn, old_columns):
+    """Fill temp.import_id_map with the live ``lyrics`` id of every dedupe key.
+
+    Songs that survive an import keep their id, so the TF-IDF artifact,
+    sentiments and neighbour lists computed for them stay valid.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.import_id_map")
+    conn.execute("CREATE TEMP TABLE import_id_map (dedupe_key TEXT PRIMARY KEY, old_id INTEGER NOT NULL)")
+    if 'dedupe_key' in dict(old_columns):
+        conn.execute(
+            "INSERT OR IGNORE INTO temp.import_id_map (dedupe_key, old_id) "
+            "SELECT dedupe_key, id FROM lyrics ORDER BY id"
+        )
+        return
+    # A table from before the importer: derive the keys the same way
+    rows = conn.execute("SELECT id, artist, title FROM lyrics ORDER BY id")
+    conn.executemany(
+        "INSERT OR IGNORE INTO temp.import_id_map (dedupe_key, old_id) VALUES (?, ?)",
+        ((dedupe_key(artist, title), lyric_id) for lyric_id, artist, title in rows)
+    )
+
+
+def invalidate_derived(conn, log=print):
+    """Drop derived rows for songs that were removed or whose lyric changed.
+
+    Expects ``lyrics`` to still be the old table and ``lyrics_import`` the
+    new one. Cluster tables are dropped outright: their counts and sample
+    positions cover the whole catalogue, and label_new_songs rebuilds them.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.import_stale")
+    conn.execute("CREATE TEMP TABLE import_stale (id INTEGER PRIMARY KEY)")
+    conn.execute("""
+        INSERT INTO temp.import_stale (id)
+        SELECT o.id FROM lyrics o LEFT JOIN lyrics_import n ON n.id = o.id
+        WHERE n.id IS NULL OR n.lyric IS NOT o.lyric
+    """)
+    stale = conn.execute("SELECT COUNT(*) FROM temp.import_stale").fetchone()[0]
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    if stale:
+        for table, columns in ID_KEYED_TABLES.items():
+            if table in existing:
+                condition = ' OR '.join(f"{column} IN (SELECT id FROM temp.import_stale)" for column in columns)
+                conn.execute(f"DELETE FROM {table} WHERE {condition}")
+    if 'song_neighbours_meta' in existing:
+        # Bump the version so API workers drop their cached neighbour lists
+        conn.execute(
+            "UPDATE song_neighbours_meta SET version = version || ?",
+            (f":import{time.strftime('%Y%m%dT%H%M%S')}",)
+        )
+    for table in CLUSTER_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute("DROP TABLE temp.import_stale")
+    log(f"Invalidated derived data for {stale} removed or changed songs; "
+        "rerun compute_tifidf.py, compute_similarity.py and label_new_songs for new ones")
+
+
+def swap_in_staging(conn, log=print):
+    """Replace ``lyrics`` with the staging rows in one transaction.
+
+    The new table keeps every column of the live one (clean_lyrics,
+    cluster_label, ...) and the ids of songs that were already there, and
+    every index and trigger on ``lyrics`` is recreated before the commit,
+    so readers never see a half-built table.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        old_columns = table_columns(conn, 'lyrics')
+        extra = [(name, kind) for name, kind in old_columns if name not in STAGING_COLUMNS]
+        for name, kind in DERIVED_COLUMNS:
+            if name not in dict(extra):
+                extra.append((name, kind))
+        dependents = [sql for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master "
+            "WHERE tbl_name = 'lyrics' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+        )]
+
+        conn.execute("DROP TABLE IF EXISTS lyrics_import")
+        conn.execute(f"""
+            CREATE TABLE lyrics_import (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                artist TEXT,
+                title TEXT,
+                lyric TEXT,
+                dedupe_key TEXT NOT NULL{''.join(f', "{name}" {kind}' for name, kind in extra)}
+            )
+        """)
+        if old_columns:
+            map_existing_ids(conn, old_columns)
+            # New songs are numbered after every existing id, never reusing one
+            offset = conn.execute("SELECT COALESCE(MAX(id), 0) FROM lyrics").fetchone()[0]
+            carried = []
+            for name, _ in extra:
+                if name not in dict(old_columns):
+                    carried.append('NULL')
+                elif name in LYRIC_BOUND_COLUMNS:
+                    carried.append(f'CASE WHEN o.lyric IS s.lyric THEN o."{name}" END')
+                else:
+                    carried.append(f'o."{name}"')
+            conn.execute(f"""
+                INSERT INTO lyrics_import (id, artist, title, lyric, dedupe_key
+                    {''.join(f', "{name}"' for name, _ in extra)})
+                SELECT COALESCE(m.old_id, s.id + ?), s.artist, s.title, s.lyric, s.dedupe_key
+                    {''.join(f', {value}' for value in carried)}
+                FROM {STAGING_TABLE} s
+                LEFT JOIN temp.import_id_map m ON m.dedupe_key = s.dedupe_key
+                LEFT JOIN lyrics o ON o.id = m.old_id
+            """, (offset,))
+            conn.execute("DROP TABLE temp.import_id_map")
+            invalidate_derived(conn, log)
+        else:
+            conn.execute(f"""
+                INSERT INTO lyrics_import (id, artist, title, lyric, dedupe_key)
+                SELECT id, artist, title, lyric, dedupe_key FROM {STAGING_TABLE}
+            """)
+
+        conn.execute("DROP TABLE IF EXISTS lyrics")
+        conn.execute(f"DROP TABLE {STAGING_TABLE}")
+        conn.execute("ALTER TABLE lyrics_import RENAME TO lyrics")
+        # Indexes and triggers went with the old table; replay them as they were
+        for sql in dependents:
+            conn.execute(sql)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_lyrics_dedupe_key ON lyrics (dedupe_key)")
+        # Serves artist filters and keyset pages ordered by (artist, title, id)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {LYRICS_ARTIST_INDEX} ON lyrics (artist, title)")
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+        ).fetchone():
+            log("Rebuilding the full-text search index...")
+            install_search_index(conn)
+        conn.execute(f"DELETE FROM {CHECKPOINT_TABLE}")
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def import_lyrics(csv_path, db_path, batch_size=10000, restart=False, cache_mb=512, log=print):
+    """Stream ``csv_path`` into a staging table, then swap it in as ``lyrics``.
+
+    Rows with an artist+title already seen are skipped. Each batch commits
+    together with the number of CSV rows consumed, so an interrupted import
+    resumes where it stopped, and ``lyrics`` is untouched until the swap.
+    Returns ``(rows_read, rows_inserted)`` for this run.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        configure_bulk_load(conn, cache_mb)
+        signature = source_signature(csv_path)
+        already_read = prepare_staging(conn, signature, restart)
+        if already_read:
+            log(f"Resuming after {already_read} rows from the last checkpoint")
+
+        start_time = time.perf_counter()
+        rows_read = already_read
+        inserted = 0
+
+        def flush(batch):
+            nonlocal inserted
+            conn.execute("BEGIN")
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {STAGING_TABLE} (artist, title, lyric, dedupe_key) "
+                "VALUES (?, ?, ?, ?)",
+                batch
+            )
+            inserted += conn.total_changes - before
+            conn.execute(
+                f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE} (source, rows_read, updated_at) "
+                "VALUES (?, ?, datetime('now'))",
+                (signature, rows_read)
+            )
+            conn.execute("COMMIT")
+            elapsed = time.perf_counter() - start_time
+            log(f"Imported {rows_read} rows ({inserted} new, "
+                f"{(rows_read - already_read) / elapsed:,.0f} rows/s)")
+
+        with open_csv(csv_path) as file:
+            reader = csv.DictReader(file)
+            batch = []
+            for index, row in enumerate(reader):
+                if index < already_read:
+                    continue
+                batch.append((
+                    row['Artist'],
+                    row['Title'],
+                    row['Lyric'],
+                    dedupe_key(row['Artist'], row['Title']),
+                ))
+                rows_read = index + 1
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+
+        swap_in_staging(conn, log)
+        conn.execute("BEGIN")
+        artists = build_artist_catalogue(conn)
+        conn.execute("COMMIT")
+        log(f"Catalogued {artists} artists")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        elapsed = time.perf_counter() - start_time
+        total = conn.execute("SELECT COUNT(*) FROM lyrics").fetchone()[0]
+        log(f"Swapped in {total} lyrics in {elapsed:.1f}s "
+            f"({(rows_read - already_read) / max(elapsed, 1e-9):,.0f} rows/s)")
+        return rows_read, inserted
+    finally:
+        conn.close()
@@ -0,0 +1,149 @@
+import os
+import shutil
+
+import numpy as np
+
+from .similarity import top_k
+
+INDEX_DIR = 'inverted'
+
+
+class InvertedIndex:
+    """Impact-ordered posting lists over the TF-IDF matrix.
+
+    Postings of term ``t`` live in ``docs[term_ptr[t]:term_ptr[t + 1]]``
+    with their weights in ``weights``, sorted by weight descending, so the
+    first weight of each list is that term's upper bound.
+    """
+
+    def __init__(self, matrix, term_ptr, docs, weights, initial_chunk=64):
+        self.matrix = matrix
+        self.term_ptr = term_ptr
+        self.docs = docs
+        self.weights = weights
+        self.n_docs = matrix.shape[0]
+        self.initial_chunk = initial_chunk
+
+    @classmethod
+    def build(cls, matrix, **kwargs):
+        csc = matrix.tocsc()
+        term_of = np.repeat(np.arange(csc.shape[1]), np.diff(csc.indptr))
+        # Group by term, heaviest posting first within each term
+        order = np.lexsort((-csc.data, term_of))
+        return cls(
+            matrix,
+            term_ptr=csc.indptr.astype(np.int64),
+            docs=csc.indices[order].astype(np.int32),
+            weights=csc.data[order].astype(np.float32),
+            **kwargs
+        )
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, 'term_ptr.npy'), self.term_ptr)
+        np.save(os.path.join(tmp_path, 'docs.npy'), self.docs)
+        np.save(os.path.join(tmp_path, 'weights.npy'), self.weights)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, matrix, path, **kwargs):
+        return cls(
+            matrix,
+            term_ptr=np.load(os.path.join(path, 'term_ptr.npy'), mmap_mode='r'),
+            docs=np.load(os.path.join(path, 'docs.npy'), mmap_mode='r'),
+            weights=np.load(os.path.join(path, 'weights.npy'), mmap_mode='r'),
+            **kwargs
+        )
+
+    def search(self, query_vector, k, present=None):
+        """Exact top-k cosine search for one L2-normalised query vector.
+
+        Returns ``(positions, scores, postings_touched)``. Songs with a zero
+        score, or masked out by ``present``, are never returned.
+
+        Postings are consumed in growing chunks, heaviest first. After each
+        round, ``remaining`` bounds what any song can still gain, and
+        ``theta`` is the k-th best partial score. Once ``remaining <= theta``
+        no unseen song can enter the top k (MaxScore's stopping rule). Only
+        the seen songs whose partial score plus ``remaining`` still reaches
+        ``theta`` get their exact score from their CSR row.
+        """
+        query_vector = query_vector.tocsr()
+        terms = query_vector.indices.astype(np.int64)
+        q = query_vector.data.astype(np.float64)
+        keep = (q > 0) & (self.term_ptr[terms + 1] > self.term_ptr[terms])
+        terms, q = terms[keep], q[keep]
+        empty = np.empty(0, dtype=np.int64)
+        if k <= 0 or not len(terms):
+            return empty, np.empty(0), 0
+
+        pos = np.array(self.term_ptr[terms], dtype=np.int64)
+        ends = np.array(self.term_ptr[terms + 1], dtype=np.int64)
+        acc = np.zeros(self.n_docs)
+        seen = []
+        touched = 0
+        chunk = self.initial_chunk
+        theta = 0.0
+        remaining = 0.0
+
+        while True:
+            for i in range(len(terms)):
+                start, stop = pos[i], min(pos[i] + chunk, ends[i])
+                if start >= stop:
+                    continue
+                docs = self.docs[start:stop]
+                # A term lists each song once, so plain fancy-index add is safe
+                acc[docs] += q[i] * self.weights[start:stop]
+                seen.append(np.asarray(docs))
+                touched += stop - start
+                pos[i] = stop
+
+            live = pos < ends
+            if not live.any():
+                remaining = 0.0
+                break
+            remaining = float(np.dot(q[live], self.weights[pos[live]]))
+
+            seen = [np.unique(np.concatenate(seen))]
+            candidates = seen[0]
+            if present is not None:
+                candidates = candidates[present[candidates]]
+            if len(candidates) >= k:
+                theta = float(np.partition(acc[candidates], -k)[-k])
+                if remaining <= theta:
+                    break
+            chunk *= 2
+
+        candidates = np.unique(np.concatenate(seen))
+        if present is not None:
+            candidates = candidates[present[candidates]]
+        if remaining > 0:
+            candidates = candidates[acc[candidates] + remaining >= theta]
+
+        # Same row-times-query product as the brute-force path, so scores
+        # match it bit for bit
+        exact = (self.matrix[candidates] @ query_vector.T).toarray().ravel()
+        top = top_k(exact, k)
+        top = top[exact[top] > 0]
+        return candidates[top], exact[top], touched
+
+
+def load_inverted_index(artifact, **kwargs):
+    """Map the index saved with ``artifact``, building it in memory if absent."""
+    path = os.path.join(artifact.path, INDEX_DIR) if artifact.path else None
+    if path and os.path.isdir(path):
+        return InvertedIndex.load(artifact.matrix, path, **kwargs)
+    return InvertedIndex.build(artifact.matrix, **kwargs)
+
+
+def save_inverted_index(artifact, path=None):
+    """Build the index and save it in the artifact directory ``path``.
+
+    Pass it to ``save_artifact(extras=...)`` so the index is in place
+    before the version is published.
+    """
+    index = InvertedIndex.build(artifact.matrix)
+    index.save(os.path.join(path or artifact.path, INDEX_DIR))
+    return index
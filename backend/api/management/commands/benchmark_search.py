@@ -0,0 +1,73 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.models import Lyrics
+from api.search import search_lyrics
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 search with the title__icontains list filter on sampled title prefixes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help='Sampled queries')
+        parser.add_argument('--page-size', type=int, default=15)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def sample_queries(self, size, seed):
+        # Prefixes of real titles, as typed into the search bar keystroke by keystroke
+        rng = random.Random(seed)
+        titles = list(Lyrics.objects.order_by('?').values_list('title', flat=True)[:size])
+        queries = []
+        for title in titles:
+            words = title.split()
+            if not words:
+                continue
+            text = ' '.join(words[:rng.randint(1, min(2, len(words)))])
+            queries.append(text[:rng.randint(2, max(2, len(text)))])
+        return queries
+
+    def time_queries(self, run, queries):
+        latencies = []
+        for query in queries:
+            start_time = time.perf_counter()
+            run(query)
+            latencies.append(time.perf_counter() - start_time)
+        return np.asarray(latencies) * 1000
+
+    def handle(self, *args, **options):
+        queries = self.sample_queries(options['queries'], options['seed'])
+        page_size = options['page_size']
+        self.stdout.write(f"Timing {len(queries)} queries, first page of {page_size}")
+
+        def icontains(query):
+            # What the list endpoint does today: a COUNT for the paginator plus the page
+            queryset = Lyrics.objects.filter(title__icontains=query).order_by('id')
+            queryset.count()
+            return list(queryset.values('id', 'artist', 'title')[:page_size])
+
+        def fts(query):
+            return search_lyrics(query, limit=page_size + 1)
+
+        # Warm the page cache for both paths before timing
+        for query in queries[:10]:
+            icontains(query)
+            fts(query)
+
+        for name, run in (('icontains', icontains), ('fts5', fts)):
+            latencies = self.time_queries(run, queries)
+            self.stdout.write(
+                f"{name:>9}: mean {latencies.mean():8.2f}ms  p50 {np.percentile(latencies, 50):8.2f}ms  "
+                f"p95 {np.percentile(latencies, 95):8.2f}ms"
+            )
+
+        # How often the icontains results also show up in the FTS page
+        title_hits = 0
+        for query in queries:
+            expected = {row['id'] for row in icontains(query)}
+            found = {row['id'] for row in fts(query)}
+            title_hits += bool(expected & found) or not expected
+        self.stdout.write(f"Queries where FTS returns an icontains match on its first page: "
+                          f"{title_hits}/{len(queries)}")
@@ -0,0 +1,107 @@
+import io
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.sentiment import SentimentModel, model_name
+
+
+def top_label(scores):
+    return max(scores, key=lambda entry: entry['score'])['label'].upper()
+
+
+def model_megabytes(model):
+    # Serialized size, which also counts quantized weights packed outside parameters()
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+class Command(BaseCommand):
+    help = "Compare sentiment backends with fp32 on a sample of lyrics: latency, throughput, agreement"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=200, help='Lyrics in the held-out sample')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=16, help='Batch size for the throughput run')
+        parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+        parser.add_argument('--model', default=None,
+                            help='fp32 reference model, hub id or local path (default: SENTIMENT_MODEL(_PATH))')
+        parser.add_argument('--candidate', action='append', default=None, metavar='PATH_OR_ID[:int8]',
+                            help='Backend to compare; repeatable (default: the reference model with int8)')
+
+    def sample_lyrics(self, size, seed):
+        # Deterministic sample: lyrics ordered by a seeded hash of their id
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                SELECT clean_lyrics FROM lyrics
+                WHERE clean_lyrics IS NOT NULL AND clean_lyrics != ''
+                ORDER BY (id * 2654435761 + %s) %% 4294967296
+                LIMIT %s
+            ''', [seed, size])
+            return [row[0] for row in cursor.fetchall()]
+
+    def run(self, name, quantization, texts, batch_size):
+        start_time = time.perf_counter()
+        sentiment_model = SentimentModel.load(name, quantization=quantization)
+        load_seconds = time.perf_counter() - start_time
+        sentiment_model.score(texts[:1])
+
+        # One lyric per call, as the endpoint sees without batching
+        latencies = []
+        for text in texts:
+            start_time = time.perf_counter()
+            sentiment_model.score([text])
+            latencies.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        scores, _ = sentiment_model.score(texts, batch_size)
+        batch_seconds = time.perf_counter() - start_time
+        return {
+            'load_seconds': load_seconds,
+            'megabytes': model_megabytes(sentiment_model.model),
+            'latencies': np.asarray(latencies) * 1000,
+            'throughput': len(texts) / batch_seconds,
+            'scores': scores,
+        }
+
+    def handle(self, *args, **options):
+        import torch
+
+        if options['threads']:
+            torch.set_num_threads(options['threads'])
+        reference_name = options['model'] or model_name()
+        candidates = [(reference_name, None)]
+        for spec in options['candidate'] or [f"{reference_name}:int8"]:
+            if spec.endswith(':int8'):
+                candidates.append((spec[:-len(':int8')], 'int8'))
+            else:
+                candidates.append((spec, None))
+
+        texts = self.sample_lyrics(options['sample'], options['seed'])
+        if not texts:
+            self.stderr.write("No cleaned lyrics to benchmark")
+            return
+        self.stdout.write(f"Benchmarking on {len(texts)} lyrics with {torch.get_num_threads()} threads")
+
+        reference_labels = None
+        for name, quantization in candidates:
+            label = name + (f" ({quantization})" if quantization else " (fp32)")
+            self.stdout.write(f"\n{label}")
+            result = self.run(name, quantization, texts, options['batch_size'])
+            labels = [top_label(scores) for scores in result['scores']]
+            if reference_labels is None:
+                reference_labels = labels
+            agreement = np.mean([a == b for a, b in zip(labels, reference_labels)])
+            latencies = result['latencies']
+            self.stdout.write(
+                f"  load {result['load_seconds']:.1f}s, {result['megabytes']:,.0f} MB\n"
+                f"  per lyric: mean {latencies.mean():.1f}ms  p50 {np.percentile(latencies, 50):.1f}ms  "
+                f"p95 {np.percentile(latencies, 95):.1f}ms\n"
+                f"  batched: {result['throughput']:.2f} lyrics/s (batch size {options['batch_size']})\n"
+                f"  label agreement with fp32: {agreement:.1%}"
+            )
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.catalogue import build_artist_catalogue
+
+
+class Command(BaseCommand):
+    help = "Materialize the artist catalogue (song counts and normalized names) from lyrics"
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        with transaction.atomic():
+            connection.ensure_connection()
+            artists = build_artist_catalogue(connection.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Catalogued {artists} artists in {time.perf_counter() - start_time:.1f}s"
+        ))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.importer import import_lyrics
+
+
+class Command(BaseCommand):
+    help = "Bulk-load lyrics from a CSV (or .csv.gz) with Artist, Title and Lyric columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV file to import, optionally gzip-compressed')
+        parser.add_argument('--db', default=str(settings.DATABASES['default']['NAME']),
+                            help='SQLite database to load into (default: the Django database)')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows per transaction and checkpoint')
+        parser.add_argument('--cache-mb', type=int, default=512, help='SQLite page cache during the load')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore any checkpoint and start the import over')
+
+    def handle(self, *args, **options):
+        rows_read, inserted = import_lyrics(
+            options['csv_path'],
+            options['db'],
+            batch_size=options['batch_size'],
+            restart=options['restart'],
+            cache_mb=options['cache_mb'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully imported lyrics data ({rows_read} rows read, {inserted} new this run)"
+        ))
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.clustering import (
+    build_cluster_tables,
+    load_cluster_model,
+    load_cluster_summary,
+    nearest_per_cluster,
+    write_cluster_labels,
+)
+from api.tfidf_artifact import load_artifact
+
+
+class Command(BaseCommand):
+    help = "Assign songs without a cluster label to the nearest saved centroid"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Songs vectorized, assigned and written together')
+        parser.add_argument('--relabel', action='store_true',
+                            help='Reassign every song, not only unlabelled ones')
+
+    def pending_chunk(self, after_id, size, every_song):
+        # Keyset pagination over the songs still to label (or all of them)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                SELECT id, clean_lyrics, cluster_label FROM lyrics
+                WHERE id > %s
+                AND clean_lyrics IS NOT NULL AND clean_lyrics != ''
+                {'' if every_song else 'AND cluster_label IS NULL'}
+                ORDER BY id
+                LIMIT %s
+            ''', [after_id, size])
+            return cursor.fetchall()
+
+    def handle(self, *args, **options):
+        artifact = load_artifact()
+        clusters = load_cluster_model(artifact)
+        self.stdout.write(
+            f"Labelling with {clusters.n_clusters} {clusters.space} centroids "
+            f"from TF-IDF artifact {artifact.version}"
+        )
+
+        # A full relabel starts over, and so does a missing summary (the
+        # importer drops it): representatives are then taken over every
+        # labelled song. Otherwise new songs can only displace the current ones.
+        summary = None if options['relabel'] else load_cluster_summary()
+        every_song = summary is None
+        representatives = {
+            label: (row['representative']['id'], row['representative']['distance'])
+            for label, row in (summary or {}).items() if row['representative'] is not None
+        }
+
+        start_time = time.perf_counter()
+        labelled = 0
+        scanned = 0
+        last_id = 0
+        while True:
+            rows = self.pending_chunk(last_id, options['chunk_size'], every_song)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids = [lyric_id for lyric_id, _, _ in rows]
+            tfidf_rows = artifact.transform([text for _, text, _ in rows])
+            if options['relabel']:
+                labels, sq_distances = clusters.assign(tfidf_rows)
+                write_cluster_labels(ids, labels)
+                labelled += len(rows)
+            else:
+                # Existing labels are kept; only their distances are measured
+                labels = np.array([-1 if label is None else label for _, _, label in rows])
+                new = (labels < 0) | (labels >= clusters.n_clusters)
+                sq_distances = np.empty(len(rows))
+                if new.any():
+                    labels[new], sq_distances[new] = clusters.assign(tfidf_rows[new])
+                    write_cluster_labels([ids[i] for i in np.flatnonzero(new)], labels[new])
+                    labelled += int(new.sum())
+                if (~new).any():
+                    sq_distances[~new] = clusters.distances_to(tfidf_rows[~new], labels[~new])
+            representatives = nearest_per_cluster(ids, labels, sq_distances, representatives)
+            scanned += len(rows)
+            self.stdout.write(f"Labelled {labelled} of {scanned} songs "
+                              f"({scanned / (time.perf_counter() - start_time):,.0f} songs/s)")
+
+        # Always rebuilt, so tables dropped by an import come back even when
+        # there was nothing new to label
+        build_cluster_tables(clusters.top_terms, representatives)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Labelled {labelled} songs in {time.perf_counter() - start_time:.1f}s"
+        ))
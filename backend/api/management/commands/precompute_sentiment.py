@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.sentiment import (
+    ensure_sentiment_table,
+    get_sentiment_model,
+    model_name,
+    model_version,
+    scoring_mode,
+    store_sentiments,
+)
+
+
+class Command(BaseCommand):
+    help = "Score every lyric without a stored sentiment for the current model version"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=16, help='Sequences per forward pass')
+        parser.add_argument('--chunk-size', type=int, default=1024,
+                            help='Lyrics read, length-sorted and committed together')
+        parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many lyrics')
+
+    def pending_chunk(self, version, after_id, size):
+        # Lyrics already scored for this version are skipped, so a rerun
+        # resumes from where an interrupted run committed
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                SELECT l.id, l.clean_lyrics
+                FROM lyrics l
+                LEFT JOIN lyric_sentiments s
+                    ON s.lyric_id = l.id AND s.model_version = %s
+                WHERE s.lyric_id IS NULL
+                AND l.clean_lyrics IS NOT NULL AND l.clean_lyrics != ''
+                AND l.id > %s
+                ORDER BY l.id
+                LIMIT %s
+            ''', [version, after_id, size])
+            return cursor.fetchall()
+
+    def handle(self, *args, **options):
+        import torch
+
+        if options['threads']:
+            torch.set_num_threads(options['threads'])
+        ensure_sentiment_table()
+        version = model_version()
+
+        self.stdout.write(f"Loading {model_name()} ({scoring_mode()} scoring)...")
+        sentiment_model = get_sentiment_model()
+
+        start_time = time.perf_counter()
+        scored = 0
+        last_id = 0
+        limit = options['limit']
+        while limit is None or scored < limit:
+            size = options['chunk_size'] if limit is None else min(options['chunk_size'], limit - scored)
+            rows = self.pending_chunk(version, last_id, size)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            scores, truncated = sentiment_model.score(
+                [text for _, text in rows], options['batch_size']
+            )
+            with transaction.atomic():
+                store_sentiments(
+                    [(lyric_id, s, t) for (lyric_id, _), s, t in zip(rows, scores, truncated)],
+                    version,
+                )
+
+            scored += len(rows)
+            elapsed = time.perf_counter() - start_time
+            self.stdout.write(f"Scored {scored} lyrics ({scored / elapsed:,.1f} lyrics/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored sentiment for {scored} lyrics under {version} "
+            f"in {time.perf_counter() - start_time:.1f}s"
+        ))
@@ -0,0 +1,14 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_songsimilarity_tfidffeature"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(name="TfidfFeature",),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# Same name as api.importer.LYRICS_ARTIST_INDEX; spelled out so the
+# migration stays frozen and does not import application code
+LYRICS_ARTIST_INDEX = 'idx_lyrics_artist_title'
+
+
+def create_index(apps, schema_editor):
+    # lyrics is not managed by Django; only index it where it already exists
+    with schema_editor.connection.cursor() as cursor:
+        if 'lyrics' in schema_editor.connection.introspection.table_names(cursor):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {LYRICS_ARTIST_INDEX} ON lyrics (artist, title)"
+            )
+
+
+def drop_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP INDEX IF EXISTS {LYRICS_ARTIST_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_delete_tfidffeature"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
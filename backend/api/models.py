@@ -1,8 +1,6 @@
 from django.db import models
 from django.db.models import Sum
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
+from .recommender import get_recommendation_index
 
 class Lyrics(models.Model):
     id = models.AutoField(primary_key=True)
@@ -20,56 +18,9 @@ class Lyrics(models.Model):
         return f"{self.artist} - {self.title}"
 
     @classmethod
-    def get_recommendations(cls, query_text):
-        # Get all unique feature names
-        feature_names = TfidfFeature.objects.values_list(
-            'feature_name', flat=True).distinct()
-        
-        # Create vectorizer with known vocabulary
-        vectorizer = TfidfVectorizer(vocabulary=set(feature_names))
-        
-        # Transform query text
-        query_vector = vectorizer.fit_transform([query_text])
-        
-        # Get all songs with their TF-IDF features
-        songs = list(cls.objects.all())
-        song_vectors = []
-        
-        for song in songs:
-            features = dict(song.tfidffeature_set.values_list('feature_name', 'tfidf_value'))
-            vector = [features.get(feature, 0) for feature in feature_names]
-            song_vectors.append(vector)
-        
-        # Convert to numpy array
-        song_vectors = np.array(song_vectors)
-        
-        # Calculate similarities
-        similarities = cosine_similarity(query_vector, song_vectors)[0]
-        
-        # Get top 5 most similar songs
-        top_indices = np.argsort(similarities)[-5:][::-1]
-        
-        results = []
-        for idx in top_indices:
-            song = songs[int(idx)]
-            results.append({
-                'id': song.id,
-                'artist': song.artist,
-                'title': song.title,
-                'similarity_score': float(similarities[idx])
-            })
-        
-        return results
-
-
-class TfidfFeature(models.Model):
-    lyric = models.ForeignKey(Lyrics, on_delete=models.CASCADE)
-    feature_name = models.CharField(max_length=255)
-    tfidf_value = models.FloatField()
-
-    class Meta:
-        db_table = 'tfidf_features'
-        managed = False
+    def get_recommendations(cls, query_text, k=5):
+        # Answered from the index kept resident in this worker
+        return get_recommendation_index().recommend(query_text, k)
 
 
 class SongSimilarity(models.Model):
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+# Built by compute_similarity.py: each song's neighbours in both directions,
+# ranked 1..K, so a lookup is one primary-key range scan
+NEIGHBOURS_TABLE = 'song_neighbours'
+NEIGHBOURS_META_TABLE = 'song_neighbours_meta'
+# The directed top-K pairs the store is built from, used until it exists
+SIMILARITIES_TABLE = 'song_similarities'
+
+
+def fetch_neighbours(song_id, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            SELECT n.neighbour_id, l.title, l.artist, n.similarity_score
+            FROM {NEIGHBOURS_TABLE} n
+            JOIN lyrics l ON l.id = n.neighbour_id
+            WHERE n.song_id = %s AND n.rank <= %s
+            ORDER BY n.rank
+        ''', [song_id, limit])
+        return [
+            {
+                'similar_song_id': neighbour_id,
+                'title': title,
+                'artist': artist,
+                'similarity_score': float(score),
+            }
+            for neighbour_id, title, artist, score in cursor.fetchall()
+        ]
+
+
+def fetch_similarities(song_id, limit):
+    """Neighbours straight from song_similarities, for databases without the store."""
+    with connection.cursor() as cursor:
+        if SIMILARITIES_TABLE not in connection.introspection.table_names(cursor):
+            return []
+        # Legacy tables hold each pair once (the lower triangle plus the
+        # diagonal), newer ones each song's top K: read both directions,
+        # skip the song itself and keep a pair's best score
+        cursor.execute(f'''
+            SELECT n.neighbour_id, l.title, l.artist, n.similarity_score
+            FROM (
+                SELECT CASE WHEN song_id1 = %s THEN song_id2 ELSE song_id1 END AS neighbour_id,
+                       MAX(similarity_score) AS similarity_score
+                FROM {SIMILARITIES_TABLE}
+                WHERE (song_id1 = %s OR song_id2 = %s)
+                  AND song_id1 != song_id2 AND similarity_score > 0
+                GROUP BY neighbour_id
+            ) n
+            JOIN lyrics l ON l.id = n.neighbour_id
+            ORDER BY n.similarity_score DESC, n.neighbour_id
+            LIMIT %s
+        ''', [song_id, song_id, song_id, limit])
+        return [
+            {
+                'similar_song_id': neighbour_id,
+                'title': title,
+                'artist': artist,
+                'similarity_score': float(score),
+            }
+            for neighbour_id, title, artist, score in cursor.fetchall()
+        ]
+
+
+def store_version():
+    """Version of the published neighbour store, or None when there is none."""
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if NEIGHBOURS_TABLE not in tables or NEIGHBOURS_META_TABLE not in tables:
+            return None
+        cursor.execute(f"SELECT version FROM {NEIGHBOURS_META_TABLE}")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class NeighbourCache:
+    """Per-worker LRU of ``(song_id, limit) -> neighbours``.
+
+    Emptied when compute_similarity.py publishes a new store; the version
+    is checked at most every ``check_seconds``. Until a store is published
+    lookups fall back to song_similarities.
+    """
+
+    def __init__(self, max_size, check_seconds):
+        self.max_size = max_size
+        self.check_seconds = check_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._last_check = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_seconds:
+            return
+        self._last_check = now
+        try:
+            version = store_version()
+        except DatabaseError:
+            # Keep serving what we have; the next check tries again
+            return
+        if version != self._version:
+            with self._lock:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, song_id, limit):
+        self._check_version()
+        key = (int(song_id), int(limit))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self._version is None:
+            neighbours = fetch_similarities(*key)
+        else:
+            neighbours = fetch_neighbours(*key)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = neighbours
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return neighbours
+
+    def stats(self):
+        return {
+            'version': self._version,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+neighbour_cache = NeighbourCache(
+    max_size=getattr(settings, 'SIMILAR_CACHE_SIZE', 10000),
+    check_seconds=getattr(settings, 'SIMILAR_CACHE_CHECK_SECONDS', 30),
+)
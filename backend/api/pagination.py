@@ -0,0 +1,171 @@
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .catalogue import catalogue_version
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks on an indexed key instead of OFFSET.
+
+    ``?ordering=id`` (default) walks the primary key; ``?ordering=artist``
+    walks ``(artist, title, id)`` using idx_lyrics_artist_title. A page is
+    ``WHERE key > last key ORDER BY key LIMIT n + 1``, so every page costs
+    the same however deep it is. No COUNT(*) runs unless ``?count=1`` asks
+    for one. That count is cached per filter and catalogue version: a bulk
+    import publishes a new version and so never serves an old count, while
+    single-row edits through the API may show a stale count for up to
+    ``count_cache_seconds``.
+    """
+
+    page_size = 15
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    orderings = {
+        'id': ('id',),
+        'artist': ('artist', 'title', 'id'),
+    }
+    count_cache_seconds = 300
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, key, direction):
+        payload = json.dumps({'k': key, 'd': direction}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, 'next'
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            key, direction = payload['k'], payload['d']
+            if not isinstance(key, list) or len(key) != len(self.fields):
+                raise ValueError
+            for field, value in zip(self.fields, key):
+                # The id is always set; artist and title may be NULL
+                if isinstance(value, bool) or not (
+                    isinstance(value, int) if field == 'id' else value is None or isinstance(value, str)
+                ):
+                    raise ValueError
+        except (ValueError, KeyError, TypeError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor"})
+        if direction not in ('next', 'previous'):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor"})
+        return key, direction
+
+    @staticmethod
+    def beyond(field, value, forward):
+        # SQLite sorts NULL before every value, so NULL is the smallest key
+        if value is None:
+            return Q(**{f'{field}__isnull': False}) if forward else Q(pk__in=[])
+        if forward:
+            return Q(**{f'{field}__gt': value})
+        return Q(**{f'{field}__lt': value}) | Q(**{f'{field}__isnull': True})
+
+    @staticmethod
+    def same(field, value):
+        return Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+
+    def seek(self, key, forward):
+        # (a, b, c) > (x, y, z) spelled out for the ORM; the leading a >= x
+        # lets SQLite start a range scan on the index
+        last = len(self.fields) - 1
+        condition = self.beyond(self.fields[last], key[last], forward)
+        for i in range(last - 1, -1, -1):
+            field = self.fields[i]
+            condition = self.beyond(field, key[i], forward) | (self.same(field, key[i]) & condition)
+        if last:
+            field, value = self.fields[0], key[0]
+            if forward and value is not None:
+                condition &= Q(**{f'{field}__gte': value})
+            elif not forward:
+                condition &= self.same(field, None) if value is None else (
+                    Q(**{f'{field}__lte': value}) | self.same(field, None)
+                )
+        return condition
+
+    def row_key(self, row):
+        # Rows are model instances or, on the list fast path, .values() dicts
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        return [getattr(row, field) for field in self.fields]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = request.query_params.get('ordering', 'id')
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': f"must be one of {', '.join(self.orderings)}"})
+        self.fields = self.orderings[ordering]
+        size = self.get_page_size(request)
+        key, direction = self.decode_cursor(request)
+        forward = direction == 'next'
+
+        self.count = None
+        if request.query_params.get('count') == '1':
+            self.count = self.cached_count(queryset, request)
+
+        if forward:
+            queryset = queryset.order_by(*self.fields)
+        else:
+            queryset = queryset.order_by(*[f'-{field}' for field in self.fields])
+        if key is not None:
+            queryset = queryset.filter(self.seek(key, forward))
+
+        rows = list(queryset[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if not forward:
+            rows.reverse()
+
+        # Going forward there is a previous page unless this is the first one;
+        # going back there is always a next page (the one we came from)
+        self.next_key = self.row_key(rows[-1]) if rows and (has_more or not forward) else None
+        self.previous_key = self.row_key(rows[0]) if rows and key is not None and (forward or has_more) else None
+        return rows
+
+    def cached_count(self, queryset, request):
+        # Keyed by the filters only, so every page of one listing shares it
+        params = sorted(
+            (name, value) for name, value in request.query_params.items()
+            if name not in (self.cursor_query_param, self.page_size_query_param, 'count', 'ordering')
+        )
+        with connection.cursor() as cursor:
+            version = catalogue_version(cursor)
+        cache_key = 'lyrics-count:' + hashlib.sha1(
+            json.dumps([params, version]).encode('utf-8')
+        ).hexdigest()
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.count_cache_seconds)
+        return count
+
+    def link(self, key, direction):
+        if key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(key, direction))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.link(self.next_key, 'next'),
+            'previous': self.link(self.previous_key, 'previous'),
+            'results': data,
+        })
+
@@ -0,0 +1,140 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .ann import load_ann_index
+from .embeddings import load_embeddings
+from .inverted_index import load_inverted_index
+from .similarity import top_k
+from .tfidf_artifact import current_version, load_artifact
+
+
+class RecommendationIndex:
+    """Song vectors plus the id/artist/title columns needed to answer a query.
+
+    Built once per artifact version and kept resident in the worker. With
+    the ``'brute'`` engine a query costs one sparse mat-vec and a partial
+    sort; the ``'inverted'`` engine returns the same results while touching
+    only the postings of the query's terms that can still change the top k.
+    The ``'embeddings'`` engine ranks by cosine in the LSA space instead,
+    and ``'ann'`` approximates that ranking with the IVF-PQ index.
+    """
+
+    def __init__(self, artifact, artists, titles, engine='brute'):
+        self.artifact = artifact
+        self.version = artifact.version
+        self.matrix = artifact.matrix
+        self.ids = np.asarray(artifact.ids)
+        self.artists = artists
+        self.titles = titles
+        # Songs removed from the database since the fit are never returned
+        self.present = np.array([title is not None for title in titles], dtype=bool)
+        self.engine = engine
+        self.inverted = load_inverted_index(artifact) if engine == 'inverted' else None
+        self.embeddings = (
+            load_embeddings(tfidf_version=artifact.version)
+            if engine in ('embeddings', 'ann') else None
+        )
+        self.ann = load_ann_index(self.embeddings) if engine == 'ann' else None
+
+    @classmethod
+    def load(cls, version=None, engine=None):
+        from .models import Lyrics
+
+        if engine is None:
+            engine = getattr(settings, 'RECOMMENDER_ENGINE', 'brute')
+        artifact = load_artifact(version)
+        # Build the vectorizer now rather than on the first query
+        artifact.vectorizer
+        rows = {
+            song_id: (artist, title)
+            for song_id, artist, title in Lyrics.objects.values_list('id', 'artist', 'title')
+        }
+        artists = np.empty(len(artifact.ids), dtype=object)
+        titles = np.empty(len(artifact.ids), dtype=object)
+        for i, song_id in enumerate(artifact.ids.tolist()):
+            artists[i], titles[i] = rows.get(song_id, (None, None))
+        return cls(artifact, artists, titles, engine=engine)
+
+    def score(self, query_vector):
+        """Cosine score of every song against the query, by row position."""
+        # Rows and the query are L2-normalised, so the dot product is the cosine
+        scores = (self.matrix @ query_vector.T).toarray().ravel()
+        scores[~self.present] = -np.inf
+        return scores
+
+    def search(self, query_vector, k):
+        """Return ``(positions, scores)`` of the top k songs with a positive score."""
+        if self.inverted is not None:
+            positions, scores, _ = self.inverted.search(query_vector, k, present=self.present)
+            return positions, scores
+        if self.ann is not None:
+            query = self.embeddings.transform(query_vector)[0]
+            nprobe = getattr(settings, 'RECOMMENDER_ANN_NPROBE', None)
+            # Over-fetch a little so songs missing from the database can be dropped
+            positions, scores = self.ann.search(query, 2 * k, nprobe=nprobe)
+            keep = self.present[positions] & (scores > 0)
+            return positions[keep][:k], scores[keep][:k]
+        if self.embeddings is not None:
+            scores = self.embeddings.vectors @ self.embeddings.transform(query_vector)[0]
+            scores[~self.present] = -np.inf
+        else:
+            scores = self.score(query_vector)
+        positions = top_k(scores, k)
+        positions = positions[scores[positions] > 0]
+        return positions, scores[positions]
+
+    def results(self, positions, scores):
+        return [
+            {
+                'id': int(self.ids[i]),
+                'artist': self.artists[i],
+                'title': self.titles[i],
+                'similarity_score': float(score),
+            }
+            for i, score in zip(positions, scores)
+        ]
+
+    def recommend(self, query_text, k=5):
+        query_vector = self.artifact.transform([query_text])
+        return self.results(*self.search(query_vector, k))
+
+
+_index = None
+_index_lock = threading.Lock()
+_last_check = 0.0
+
+
+def get_recommendation_index():
+    """Return this worker's index, reloading it when a new artifact is published.
+
+    The published version is checked at most every
+    ``RECOMMENDER_RELOAD_CHECK_SECONDS``. While one thread loads a new
+    version the others keep answering from the old one.
+    """
+    global _index, _last_check
+
+    now = time.monotonic()
+    interval = getattr(settings, 'RECOMMENDER_RELOAD_CHECK_SECONDS', 5)
+    if _index is not None and now - _last_check < interval:
+        return _index
+
+    if _index is None:
+        # Nothing to fall back on, so wait for whoever is loading
+        with _index_lock:
+            if _index is None:
+                _index = RecommendationIndex.load()
+                _last_check = time.monotonic()
+        return _index
+
+    if _index_lock.acquire(blocking=False):
+        try:
+            _last_check = now
+            version = current_version()
+            if version is not None and version != _index.version:
+                _index = RecommendationIndex.load(version)
+        finally:
+            _index_lock.release()
+    return _index
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import re
+
+from django.core.cache import cache
+from django.db import connection
+
+from .catalogue import catalogue_version
+
+SEARCH_TABLE = 'lyrics_fts'
+
+# External-content FTS5 index over lyrics: the text lives only in `lyrics`,
+# the index holds the postings. Prefix indexes keep autocomplete prefixes
+# of 2-4 characters from scanning the whole term list.
+CREATE_SEARCH_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, artist, lyric,
+        content='lyrics', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+"""
+
+# Keep the index in step with lyrics. Updates that only touch other columns
+# (clean_lyrics, cluster_label, ...) do not reindex the row.
+SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lyrics_fts_insert AFTER INSERT ON lyrics BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, artist, lyric)
+        VALUES (new.id, new.title, new.artist, new.lyric);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lyrics_fts_delete AFTER DELETE ON lyrics BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, artist, lyric)
+        VALUES ('delete', old.id, old.title, old.artist, old.lyric);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS lyrics_fts_update AFTER UPDATE OF title, artist, lyric ON lyrics BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, artist, lyric)
+        VALUES ('delete', old.id, old.title, old.artist, old.lyric);
+        INSERT INTO {SEARCH_TABLE} (rowid, title, artist, lyric)
+        VALUES (new.id, new.title, new.artist, new.lyric);
+    END
+    """,
+]
+
+# bm25() column weights: a title match outranks an artist match, which
+# outranks a match somewhere in the lyric
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# How long a search's match count is reused; a bulk import also changes
+# the catalogue version in the cache key
+SEARCH_COUNT_CACHE_SECONDS = 300
+
+
+def install_search_index(cursor, rebuild=True):
+    """Create the FTS5 table and triggers, and (re)index every lyric.
+
+    ``cursor`` is anything with ``execute(sql)``: a Django cursor or a
+    sqlite3 connection such as the bulk importer's.
+    """
+    cursor.execute(CREATE_SEARCH_TABLE)
+    for trigger in SEARCH_TRIGGERS:
+        cursor.execute(trigger)
+    if rebuild:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def fts_query(text, prefix=True):
+    """Turn user input into an FTS5 query: every word must match, the last as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation typed by the user
+    are never interpreted.
+    """
+    tokens = TOKEN_PATTERN.findall(text)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_lyrics(text, limit=15, offset=0, artist=None, prefix=True):
+    """BM25-ranked matches for ``text`` in title, artist or lyric, with a highlighted snippet."""
+    query = fts_query(text, prefix)
+    if query is None:
+        return []
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    sql = f'''
+        SELECT l.id, l.artist, l.title,
+               bm25({SEARCH_TABLE}, {weights}) AS rank,
+               snippet({SEARCH_TABLE}, -1, '<mark>', '</mark>', '…', 12) AS snippet
+        FROM {SEARCH_TABLE}
+        JOIN lyrics l ON l.id = {SEARCH_TABLE}.rowid
+        WHERE {SEARCH_TABLE} MATCH %s
+    '''
+    params = [query]
+    if artist:
+        sql += ' AND l.artist = %s'
+        params.append(artist)
+    sql += ' ORDER BY rank LIMIT %s OFFSET %s'
+    params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {
+                'id': lyric_id,
+                'artist': lyric_artist,
+                'title': title,
+                # bm25() is lower-is-better; flip it so higher means more relevant
+                'score': -float(rank),
+                'snippet': snippet,
+            }
+            for lyric_id, lyric_artist, title, rank, snippet in cursor.fetchall()
+        ]
+
+
+def search_count(text, artist=None, prefix=True):
+    """Number of lyrics matching ``text``, cached per query and catalogue version."""
+    query = fts_query(text, prefix)
+    if query is None:
+        return 0
+    with connection.cursor() as cursor:
+        version = catalogue_version(cursor)
+        cache_key = 'lyrics-search-count:' + hashlib.sha1(
+            json.dumps([query, artist, version]).encode('utf-8')
+        ).hexdigest()
+        count = cache.get(cache_key)
+        if count is not None:
+            return count
+        sql = f'SELECT COUNT(*) FROM {SEARCH_TABLE}'
+        params = [query]
+        if artist:
+            sql += f' JOIN lyrics l ON l.id = {SEARCH_TABLE}.rowid WHERE {SEARCH_TABLE} MATCH %s AND l.artist = %s'
+            params.append(artist)
+        else:
+            sql += f' WHERE {SEARCH_TABLE} MATCH %s'
+        cursor.execute(sql, params)
+        count = cursor.fetchone()[0]
+    cache.set(cache_key, count, SEARCH_COUNT_CACHE_SECONDS)
+    return count
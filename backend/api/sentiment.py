@@ -0,0 +1,291 @@
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+# Token budget of the original endpoint: 510 ids including <s> and </s>
+MAX_TOKENS = 510
+
+
+def model_name():
+    """Hub id of the sentiment model, or the local checkpoint that replaces it."""
+    return (
+        getattr(settings, 'SENTIMENT_MODEL_PATH', None)
+        or getattr(settings, 'SENTIMENT_MODEL', "siebert/sentiment-roberta-large-english")
+    )
+
+
+def quantization():
+    """None for fp32 weights, 'int8' for dynamically quantized Linear layers."""
+    return getattr(settings, 'SENTIMENT_QUANTIZATION', None)
+
+
+def scoring_mode():
+    """'first' scores the first MAX_TOKENS tokens, 'windows' the whole lyric."""
+    return getattr(settings, 'SENTIMENT_SCORING', 'first')
+
+
+def window_stride():
+    return getattr(settings, 'SENTIMENT_WINDOW_STRIDE', 384)
+
+
+def model_version():
+    """Key stored scores by; change SENTIMENT_MODEL_VERSION to rescore everything."""
+    backend = model_name() + (f"+{quantization()}" if quantization() else "")
+    default = (
+        f"{backend}:windows{MAX_TOKENS}/{window_stride()}" if scoring_mode() == 'windows'
+        else f"{backend}:first{MAX_TOKENS}"
+    )
+    return getattr(settings, 'SENTIMENT_MODEL_VERSION', default)
+
+
+_table_ready = False
+
+
+def ensure_sentiment_table():
+    global _table_ready
+    if _table_ready:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lyric_sentiments (
+                lyric_id INTEGER NOT NULL,
+                model_version TEXT NOT NULL,
+                scores TEXT NOT NULL,
+                truncated INTEGER NOT NULL,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                PRIMARY KEY (lyric_id, model_version),
+                FOREIGN KEY (lyric_id) REFERENCES lyrics (id)
+            )
+        ''')
+    _table_ready = True
+
+
+def get_stored_sentiment(lyric_id, version=None):
+    """Return ``{"sentiment_scores": [...], "truncated": bool}`` or None if not scored."""
+    ensure_sentiment_table()
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT scores, truncated FROM lyric_sentiments
+            WHERE lyric_id = %s AND model_version = %s
+        ''', [lyric_id, version or model_version()])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return {"sentiment_scores": json.loads(row[0]), "truncated": bool(row[1])}
+
+
+def store_sentiments(rows, version=None):
+    """Upsert ``(lyric_id, sentiment_scores, truncated)`` rows."""
+    version = version or model_version()
+    ensure_sentiment_table()
+    with connection.cursor() as cursor:
+        cursor.executemany('''
+            INSERT OR REPLACE INTO lyric_sentiments (lyric_id, model_version, scores, truncated)
+            VALUES (%s, %s, %s, %s)
+        ''', [
+            (lyric_id, version, json.dumps(scores), int(truncated))
+            for lyric_id, scores, truncated in rows
+        ])
+
+
+def encode_truncated(tokenizer, texts):
+    """Token ids clipped to the endpoint's budget, plus whether each was clipped."""
+    body = MAX_TOKENS - tokenizer.num_special_tokens_to_add()
+    encoded = tokenizer(list(texts), add_special_tokens=False)['input_ids']
+    return (
+        [tokenizer.build_inputs_with_special_tokens(ids[:body]) for ids in encoded],
+        [len(ids) > body for ids in encoded],
+    )
+
+
+def encode_windows(tokenizer, texts, stride=None):
+    """Tokenize once and cut each text into overlapping windows of token ids.
+
+    Returns ``(windows, owners, weights)``: the windows with special tokens
+    added, the index of the text each came from and its token count.
+    """
+    body = MAX_TOKENS - tokenizer.num_special_tokens_to_add()
+    stride = min(stride or window_stride(), body)
+    encoded = tokenizer(list(texts), add_special_tokens=False)['input_ids']
+    windows, owners, weights = [], [], []
+    for owner, ids in enumerate(encoded):
+        start = 0
+        while True:
+            piece = ids[start:start + body]
+            windows.append(tokenizer.build_inputs_with_special_tokens(piece))
+            owners.append(owner)
+            weights.append(max(len(piece), 1))
+            if start + body >= len(ids):
+                break
+            start += stride
+    return windows, owners, weights
+
+
+def aggregate_windows(window_scores, owners, weights, n_texts):
+    # Length-weighted mean of each label's probability over a text's windows
+    totals = [None] * n_texts
+    weight_sums = [0.0] * n_texts
+    for scores, owner, weight in zip(window_scores, owners, weights):
+        if totals[owner] is None:
+            totals[owner] = {entry['label']: 0.0 for entry in scores}
+        for entry in scores:
+            totals[owner][entry['label']] += weight * entry['score']
+        weight_sums[owner] += weight
+    return [
+        [{'label': label, 'score': total / weight_sums[i]} for label, total in totals[i].items()]
+        for i in range(n_texts)
+    ]
+
+
+def score_texts(model, tokenizer, texts, batch_size=16, mode=None):
+    """Score texts in the configured mode; returns ``(score lists, truncated flags)``.
+
+    In 'windows' mode every window of every text goes through
+    score_id_batches() together, so a full song costs about one forward
+    pass per window and nothing is truncated.
+    """
+    texts = list(texts)
+    if (mode or scoring_mode()) == 'first':
+        id_lists, truncated = encode_truncated(tokenizer, texts)
+        return score_id_batches(model, tokenizer, id_lists, batch_size), truncated
+    windows, owners, weights = encode_windows(tokenizer, texts)
+    window_scores = score_id_batches(model, tokenizer, windows, batch_size)
+    return aggregate_windows(window_scores, owners, weights, len(texts)), [False] * len(texts)
+
+
+def score_id_batches(model, tokenizer, id_lists, batch_size=16):
+    """Run the classifier over token id lists; returns one score list per input.
+
+    Inputs are scored in ascending length order so each padded batch holds
+    sequences of similar length, then returned in the original order.
+    """
+    import torch
+
+    order = sorted(range(len(id_lists)), key=lambda i: len(id_lists[i]))
+    labels = [model.config.id2label[i] for i in range(model.config.num_labels)]
+    results = [None] * len(id_lists)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = tokenizer.pad(
+                {'input_ids': [id_lists[i] for i in batch]}, return_tensors='pt'
+            )
+            probabilities = model(**inputs).logits.softmax(dim=-1).tolist()
+            for i, row in zip(batch, probabilities):
+                results[i] = [{'label': label, 'score': score} for label, score in zip(labels, row)]
+    return results
+
+
+class SentimentModel:
+    """Tokenizer and classifier for the configured sentiment model.
+
+    The tokenizer is loaded once and shared by score_texts() and the
+    text-in ``pipeline``, which is built from the same objects on demand.
+    """
+
+    def __init__(self, name, tokenizer, model, quantization=None, load_metrics=None):
+        self.name = name
+        self.tokenizer = tokenizer
+        self.model = model
+        self.quantization = quantization
+        self.load_metrics = load_metrics or {}
+        self._pipeline = None
+        self._pipeline_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, name=None, quantization=None):
+        """Load ``name`` (a hub id or a local checkpoint directory).
+
+        A local directory is read without touching the network. With
+        ``quantization='int8'`` the Linear layers are dynamically quantized
+        for CPU inference.
+        """
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        name = name or model_name()
+        local = os.path.isdir(name)
+        start_time = time.perf_counter()
+        tokenizer = AutoTokenizer.from_pretrained(name, local_files_only=local)
+        tokenizer_seconds = time.perf_counter() - start_time
+        model = AutoModelForSequenceClassification.from_pretrained(name, local_files_only=local).eval()
+        model_seconds = time.perf_counter() - start_time - tokenizer_seconds
+        if quantization == 'int8':
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif quantization is not None:
+            raise ValueError(f"Unknown sentiment quantization {quantization!r}")
+        return cls(name, tokenizer, model, quantization, {
+            'model': name,
+            'quantization': quantization,
+            'pid': os.getpid(),
+            'tokenizer_seconds': tokenizer_seconds,
+            'model_seconds': model_seconds,
+            'quantize_seconds': time.perf_counter() - start_time - tokenizer_seconds - model_seconds,
+        })
+
+    @property
+    def pipeline(self):
+        if self._pipeline is None:
+            with self._pipeline_lock:
+                if self._pipeline is None:
+                    from transformers import pipeline
+
+                    self._pipeline = pipeline(
+                        "sentiment-analysis",
+                        model=self.model,
+                        tokenizer=self.tokenizer,
+                        return_all_scores=True
+                    )
+        return self._pipeline
+
+    def score(self, texts, batch_size=16):
+        return score_texts(self.model, self.tokenizer, texts, batch_size)
+
+
+_model = None
+_model_lock = threading.Lock()
+_load_metrics = {}
+
+
+def get_sentiment_model():
+    """Return this process's SentimentModel, loading it on first use.
+
+    Nothing is loaded at import, so manage.py commands and workers that
+    never score sentiment do not pay for the model.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = SentimentModel.load(quantization=quantization())
+                _load_metrics.update(_model.load_metrics)
+    return _model
+
+
+def warmup_sentiment_model():
+    # One small forward pass so the first real request does not pay for
+    # lazy kernel and allocator setup
+    start_time = time.perf_counter()
+    get_sentiment_model().score(["warm up"])
+    _load_metrics['warmup_seconds'] = time.perf_counter() - start_time
+
+
+def preload_sentiment_model(warmup=False):
+    """Load the model now, e.g. in a gunicorn --preload master before forking.
+
+    Forked workers then share the weights copy-on-write. Warming up runs
+    a forward pass in this process, so leave it off before forking when
+    the torch build's thread pool is not fork-safe.
+    """
+    get_sentiment_model()
+    _load_metrics['preloaded'] = True
+    if warmup:
+        warmup_sentiment_model()
+
+
+def sentiment_load_metrics():
+    return {'loaded': _model is not None, **_load_metrics}
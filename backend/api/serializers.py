@@ -1,7 +1,32 @@
 from rest_framework import serializers
 from .models import Lyrics
 
+# Columns a client may ask for with ?fields=
+LYRICS_FIELDS = ('id', 'artist', 'title', 'lyric', 'clean_lyrics')
+# What the list shows by default: the table needs no lyric text
+LIST_FIELDS = ('id', 'artist', 'title')
+
 class LyricsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lyrics
-        fields = ['id', 'title', 'artist', 'lyric', 'clean_lyrics']
+        fields = list(LYRICS_FIELDS)
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # Optional sparse fieldset, e.g. from ?fields=id,title
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+def parse_fields(value, default):
+    """Validate a ``fields=a,b`` parameter; returns the field names in request order."""
+    if not value:
+        return tuple(default)
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in LYRICS_FIELDS]
+    if unknown or not fields:
+        raise serializers.ValidationError(
+            {'fields': f"Unknown field(s) {', '.join(unknown) or '(none)'}; "
+                       f"choose from {', '.join(LYRICS_FIELDS)}"}
+        )
+    return fields
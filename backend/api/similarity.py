@@ -0,0 +1,98 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+# Per-process copies of the matrix, set once by _init_worker so each block
+# only ships (start, stop) to the worker instead of the whole matrix.
+_matrix = None
+_matrix_t = None
+
+
+def _init_worker(matrix):
+    global _matrix, _matrix_t
+    _matrix = matrix
+    # Transpose once per worker; otherwise scipy converts on every product.
+    # Dense embeddings go straight to BLAS, which handles the transposed view.
+    _matrix_t = matrix.T.tocsr() if sp.issparse(matrix) else matrix.T
+
+
+def _block_topk(start, stop, k, min_score):
+    """Score rows [start, stop) against every row and keep each row's top k."""
+    n = _matrix.shape[0]
+    scores = _matrix[start:stop] @ _matrix_t
+    if sp.issparse(scores):
+        scores = scores.toarray()
+
+    # A song is never its own neighbour
+    rows = np.arange(stop - start)
+    scores[rows, rows + start] = -np.inf
+
+    k = min(k, n - 1)
+    if k <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    # Partial sort for the top k columns, then order only those k
+    top_idx = np.argpartition(scores, -k, axis=1)[:, -k:]
+    top_scores = np.take_along_axis(scores, top_idx, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top_idx = np.take_along_axis(top_idx, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    keep = top_scores > min_score
+    sources = np.broadcast_to(np.arange(start, stop)[:, None], top_idx.shape)
+    return sources[keep], top_idx[keep], top_scores[keep]
+
+
+def top_k(scores, k):
+    """Positions of the k highest scores, best first, via a partial sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def default_block_size(n_rows, mem_budget_mb=256):
+    """Rows per block so one dense float32 score block fits in the budget."""
+    return int(max(1, min(n_rows, mem_budget_mb * 2**20 // (4 * max(n_rows, 1)))))
+
+
+def iter_topk(matrix, k=10, min_score=0.0, block_size=None, n_jobs=None,
+              mem_budget_mb=256):
+    """Yield (sources, neighbours, scores) row positions block by block.
+
+    ``matrix`` is either the sparse TF-IDF matrix or dense song embeddings.
+    Blocks come back in row order. At most ``2 * n_jobs`` blocks are in
+    flight, so memory stays bounded by the block size whatever the corpus
+    size.
+    """
+    if sp.issparse(matrix):
+        matrix = normalize(matrix.astype(np.float32), copy=False).tocsr()
+    else:
+        matrix = normalize(np.asarray(matrix, dtype=np.float32))
+    n = matrix.shape[0]
+    if block_size is None:
+        block_size = default_block_size(n, mem_budget_mb)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    bounds = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+
+    if n_jobs == 1 or len(bounds) <= 1:
+        _init_worker(matrix)
+        for start, stop in bounds:
+            yield _block_topk(start, stop, k, min_score)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(matrix,)) as pool:
+        pending = deque()
+        for start, stop in bounds:
+            pending.append(pool.submit(_block_topk, start, stop, k, min_score))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,3 +1,398 @@
-from django.test import TestCase
+import os
+import re
+import sys
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import contractions
+import numpy as np
+import scipy.sparse as sp
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+from nltk.tokenize import NLTKWordTokenizer
+from sklearn.preprocessing import normalize
+
+from .admission import AdmissionController
+from .inverted_index import InvertedIndex
+from .neighbours import NeighbourCache
+from .pagination import KeysetPagination
+from .similarity import top_k
+
+# The pipeline scripts live next to the backend directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import clean_lyrics
+
+
+def random_tfidf(n_docs, n_terms, density, seed):
+    matrix = sp.random(n_docs, n_terms, density=density, format='csr', dtype=np.float32,
+                       random_state=seed)
+    return normalize(matrix).astype(np.float32).tocsr()
+
+
+class InvertedIndexSearchTests(SimpleTestCase):
+    """MaxScore search must return what a full mat-vec would."""
+
+    def brute_force(self, matrix, query, k, present=None):
+        scores = (matrix @ query.T).toarray().ravel()
+        if present is not None:
+            scores[~present] = -np.inf
+        positions = top_k(scores, k)
+        positions = positions[scores[positions] > 0]
+        return positions, scores[positions]
+
+    def assertSameTopK(self, matrix, query, k, present=None, initial_chunk=2):
+        index = InvertedIndex.build(matrix, initial_chunk=initial_chunk)
+        positions, scores, _ = index.search(query, k, present=present)
+        want_positions, want_scores = self.brute_force(matrix, query, k, present)
+
+        np.testing.assert_array_equal(scores, want_scores)
+        # Songs tied with any other song may come back in either order (or
+        # swap places across the k-th cut); every other position must match
+        full = (matrix @ query.T).toarray().ravel()
+        values, counts = np.unique(full, return_counts=True)
+        untied = set(values[counts == 1].tolist())
+        for got, want, score in zip(positions.tolist(), want_positions.tolist(), want_scores.tolist()):
+            if score in untied:
+                self.assertEqual(got, want)
+        np.testing.assert_array_equal(full[positions], scores)
+        self.assertEqual(len(set(positions.tolist())), len(positions))
+        return positions, scores
+
+    def test_matches_brute_force(self):
+        matrix = random_tfidf(300, 40, 0.15, seed=1)
+        for seed in range(20):
+            query = random_tfidf(1, 40, 0.1, seed=100 + seed)
+            for k in (1, 5, 20):
+                self.assertSameTopK(matrix, query, k)
+
+    def test_tied_scores(self):
+        # Every row appears three times, so most top-k boundaries fall on a tie
+        base = random_tfidf(40, 20, 0.2, seed=2)
+        matrix = sp.vstack([base, base, base]).tocsr()
+        for seed in range(10):
+            query = random_tfidf(1, 20, 0.2, seed=200 + seed)
+            for k in (1, 2, 4, 10):
+                self.assertSameTopK(matrix, query, k)
+
+    def test_present_mask(self):
+        matrix = random_tfidf(300, 40, 0.15, seed=3)
+        present = np.random.default_rng(3).random(300) > 0.5
+        for seed in range(10):
+            query = random_tfidf(1, 40, 0.1, seed=300 + seed)
+            positions, _ = self.assertSameTopK(matrix, query, 10, present=present)
+            self.assertTrue(present[positions].all())
+
+    def test_k_larger_than_matches(self):
+        matrix = random_tfidf(300, 40, 0.05, seed=4)
+        term = 7
+        query = sp.csr_matrix(([1.0], ([0], [term])), shape=(1, 40), dtype=np.float32)
+        matches = matrix[:, term].nnz
+        positions, scores = self.assertSameTopK(matrix, query, matches + 50)
+        self.assertEqual(len(positions), matches)
+        self.assertTrue((scores > 0).all())
+
+    def test_no_matching_terms(self):
+        matrix = random_tfidf(50, 10, 0.2, seed=5)
+        matrix[:, 3] = 0
+        matrix.eliminate_zeros()
+        query = sp.csr_matrix(([1.0], ([0], [3])), shape=(1, 10), dtype=np.float32)
+        positions, scores, touched = InvertedIndex.build(matrix).search(query, 5)
+        self.assertEqual(len(positions), 0)
+        self.assertEqual(touched, 0)
+
+
+# Short lyrics that exercise contractions, slang the Treebank tokenizer
+# splits, punctuation, digits and non-ASCII text
+GOLDEN_LYRICS = [
+    "I'm gonna love you 'til the end of time, baby",
+    "You wanna dance? I cannot stop, gotta keep movin'",
+    "Gimme gimme more, lemme go... wanna be free\nwanna",
+    "Oh-oh-oh, yeah yeah! La la la (na na na)",
+    "She said: \"Don't you ever, ever leave me\" -- 1999",
+    "Café déjà vu, niño — ¿qué pasa?\tTab\r\nCRLF",
+    "Y'all ain't seen nothin' yet; we'll rock 'n' roll",
+    "   leading and trailing whitespace   ",
+    "",
+]
+
+# A stand-in for the NLTK corpus, so the tests need no downloaded data;
+# filtering is the same in both paths, only tokenization differs
+TEST_STOPWORDS = frozenset({
+    'the', 'of', 'to', 'and', 'a', 'be', 'do', 'we', 'am', 'are', 'all', 'will', 'can',
+    'la', 'oh', 'ooh', 'yeah', 'na', 'uh', 'woah', 'ah', 'hey', 'baby', 'whoa',
+})
+
+
+def reference_clean_lyrics(text):
+    # The original clean_lyrics(). word_tokenize() is Punkt sentence
+    # splitting followed by NLTKWordTokenizer; once only [a-z ] is left
+    # there is nothing for Punkt to split on, so the tokenizer alone gives
+    # the same tokens without the Punkt model.
+    text = text.lower()
+    text = contractions.fix(text)
+    text = re.sub(r'[^a-z\s]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    tokens = NLTKWordTokenizer().tokenize(text)
+    tokens = [word for word in tokens if word not in TEST_STOPWORDS]
+    text = ' '.join(tokens)
+    text = text.strip()
+    return text
+
+
+@mock.patch.object(clean_lyrics, '_stopwords', TEST_STOPWORDS)
+class CleanLyricsTests(SimpleTestCase):
+    """The regex tokenizer must clean lyrics exactly like the original NLTK path."""
+
+    def test_golden_lyrics_match_original(self):
+        for text in GOLDEN_LYRICS:
+            with self.subTest(text=text):
+                self.assertEqual(clean_lyrics.clean_lyrics(text, 'regex'), reference_clean_lyrics(text))
+
+    def test_treebank_splits_match_nltk(self):
+        text = ' '.join(clean_lyrics.TREEBANK_SPLITS) + ' cannot stop gonna wanna'
+        self.assertEqual(clean_lyrics.regex_tokenize(text), NLTKWordTokenizer().tokenize(text))
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    """Run, queue, time out or reject, and always give the slots back."""
+
+    def wait_for(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail("condition not reached in time")
+            time.sleep(0.005)
+
+    def acquire_in_thread(self, controller):
+        result = {}
+        thread = threading.Thread(target=lambda: result.setdefault('admitted', controller.acquire()))
+        thread.start()
+        return thread, result
+
+    def assertIdle(self, controller):
+        stats = controller.stats()
+        self.assertEqual(stats['active'], 0)
+        self.assertEqual(stats['waiting'], 0)
+
+    def test_admitted_immediately(self):
+        controller = AdmissionController('test', slots=2, max_queue=1, timeout=1.0)
+        self.assertTrue(controller.acquire())
+        self.assertTrue(controller.acquire())
+        self.assertEqual(controller.stats()['active'], 2)
+        self.assertEqual(controller.stats()['queued'], 0)
+        controller.release()
+        controller.release()
+        self.assertIdle(controller)
+
+    def test_queued_then_admitted_on_release(self):
+        controller = AdmissionController('test', slots=1, max_queue=1, timeout=5.0)
+        self.assertTrue(controller.acquire())
+        thread, result = self.acquire_in_thread(controller)
+        self.wait_for(lambda: controller.stats()['waiting'] == 1)
+        self.assertNotIn('admitted', result)
+
+        controller.release()
+        thread.join(5.0)
+        self.assertTrue(result['admitted'])
+        stats = controller.stats()
+        self.assertEqual((stats['active'], stats['queued'], stats['admitted']), (1, 1, 2))
+        controller.release()
+        self.assertIdle(controller)
+
+    def test_timed_out_in_queue(self):
+        controller = AdmissionController('test', slots=1, max_queue=1, timeout=0.05)
+        self.assertTrue(controller.acquire())
+        thread, result = self.acquire_in_thread(controller)
+        thread.join(5.0)
+        self.assertFalse(result['admitted'])
+        stats = controller.stats()
+        self.assertEqual((stats['timed_out'], stats['rejected'], stats['waiting']), (1, 1, 0))
+        controller.release()
+        self.assertIdle(controller)
+
+    def test_rejected_when_queue_full(self):
+        controller = AdmissionController('test', slots=1, max_queue=1, timeout=5.0)
+        self.assertTrue(controller.acquire())
+        thread, result = self.acquire_in_thread(controller)
+        self.wait_for(lambda: controller.stats()['waiting'] == 1)
+
+        # Slot taken and queue full: turned away without waiting
+        started = time.monotonic()
+        self.assertFalse(controller.acquire())
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(controller.stats()['rejected'], 1)
+        self.assertEqual(controller.stats()['timed_out'], 0)
+
+        controller.release()
+        thread.join(5.0)
+        self.assertTrue(result['admitted'])
+        controller.release()
+        self.assertIdle(controller)
+
+    def test_many_threads_never_exceed_slots(self):
+        controller = AdmissionController('test', slots=3, max_queue=100, timeout=5.0)
+        peak = []
+        lock = threading.Lock()
+
+        def request():
+            if controller.acquire():
+                try:
+                    with lock:
+                        peak.append(controller.stats()['active'])
+                    time.sleep(0.005)
+                finally:
+                    controller.release()
+
+        threads = [threading.Thread(target=request) for _ in range(30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10.0)
+        self.assertEqual(len(peak), 30)
+        self.assertLessEqual(max(peak), 3)
+        self.assertIdle(controller)
+
+
+def create_lyrics_table(rows):
+    # lyrics is unmanaged, so test databases do not get it from migrations
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lyrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                artist TEXT, title TEXT, lyric TEXT, clean_lyrics TEXT, cluster_label INTEGER
+            )
+        ''')
+        cursor.executemany(
+            'INSERT INTO lyrics (id, artist, title, lyric) VALUES (%s, %s, %s, %s)', rows
+        )
+
+
+class SimilarFallbackTests(TestCase):
+    """Without song_neighbours, neighbours come from the legacy song_similarities table."""
+
+    def setUp(self):
+        create_lyrics_table([(i, f'Artist {i}', f'Song {i}', '') for i in range(1, 6)])
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                CREATE TABLE song_similarities (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    song_id1 INTEGER NOT NULL, song_id2 INTEGER NOT NULL, similarity_score REAL NOT NULL
+                )
+            ''')
+            # Lower triangle plus the diagonal, as the original compute_similarity.py stored it
+            pairs = [(1, 1, 1.0), (2, 2, 1.0), (3, 3, 1.0), (4, 4, 1.0), (5, 5, 1.0),
+                     (2, 1, 0.5), (3, 1, 0.2), (3, 2, 0.9), (4, 3, 0.7), (5, 3, 0.0)]
+            cursor.executemany(
+                'INSERT INTO song_similarities (song_id1, song_id2, similarity_score) VALUES (%s, %s, %s)',
+                pairs
+            )
+        self.cache = NeighbourCache(max_size=10, check_seconds=0)
+
+    def neighbour_ids(self, song_id, limit=5):
+        return [row['similar_song_id'] for row in self.cache.get(song_id, limit)]
+
+    def test_both_directions_without_self(self):
+        self.assertEqual(self.neighbour_ids(3), [2, 4, 1])
+        self.assertEqual(self.neighbour_ids(1), [2, 3])
+        self.assertEqual(self.neighbour_ids(5), [])
+
+    def test_limit(self):
+        self.assertEqual(self.neighbour_ids(3, limit=2), [2, 4])
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover every row once, in order, both ways, NULL keys included."""
+
+    ROWS = [
+        (1, 'Beta', 'One'), (2, None, 'Two'), (3, 'Alpha', None), (4, 'Beta', 'One'),
+        (5, 'Alpha', 'Zed'), (6, None, None), (7, 'Beta', None), (8, 'Gamma', 'Ant'),
+        (9, None, 'Two'), (10, 'Alpha', 'Zed'), (11, 'Beta', 'Ant'),
+    ]
+
+    def setUp(self):
+        create_lyrics_table([(i, artist, title, '') for i, artist, title in self.ROWS])
+        self.client = APIClient()
+
+    def expected_ids(self, ordering):
+        if ordering == 'id':
+            return [row[0] for row in self.ROWS]
+        # NULL sorts first, as in SQLite
+        key = lambda row: ((row[1] is not None, row[1] or ''), (row[2] is not None, row[2] or ''), row[0])
+        return [row[0] for row in sorted(self.ROWS, key=key)]
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, ordering, page_size):
+        pages = []
+        data = self.get(f'/api/lyrics/?pagination=cursor&ordering={ordering}'
+                        f'&page_size={page_size}&fields=id')
+        pages.append([row['id'] for row in data['results']])
+        self.assertIsNone(data['previous'])
+        while data['next']:
+            data = self.get(data['next'])
+            pages.append([row['id'] for row in data['results']])
+
+        # Back from the last page over the previous links
+        back = [pages[-1]]
+        while data['previous']:
+            data = self.get(data['previous'])
+            back.append([row['id'] for row in data['results']])
+        return pages, back[::-1]
+
+    def test_walk_both_orderings(self):
+        for ordering in ('id', 'artist'):
+            for page_size in (1, 2, 3, 5, 20):
+                with self.subTest(ordering=ordering, page_size=page_size):
+                    pages, back = self.walk(ordering, page_size)
+                    self.assertEqual(sum(pages, []), self.expected_ids(ordering))
+                    self.assertTrue(all(len(page) == page_size for page in pages[:-1]))
+                    self.assertEqual(back, pages)
+
+    def test_invalid_cursor_is_bad_request(self):
+        pagination = KeysetPagination()
+        pagination.fields = KeysetPagination.orderings['artist']
+        cursors = [
+            'not-base64!', pagination.encode_cursor('abc', 'next'),
+            pagination.encode_cursor({'a': 1}, 'next'), pagination.encode_cursor(5, 'next'),
+            pagination.encode_cursor(['a', 'b'], 'next'),
+            pagination.encode_cursor([{'x': 1}, 'b', 1], 'next'),
+            pagination.encode_cursor(['a', 'b', 'c'], 'next'),
+            pagination.encode_cursor(['a', 'b', 1], 'sideways'),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/lyrics/', {'ordering': 'artist', 'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+class ArtistsFallbackTests(TestCase):
+    """Before the catalogue is built, ?q= and ?limit= still apply."""
+
+    def setUp(self):
+        create_lyrics_table([
+            (1, 'Alpha', 'A', ''), (2, 'alpine', 'B', ''), (3, 'Alpine', 'C', ''),
+            (4, 'alpine', 'D', ''), (5, 'Beta', 'E', ''), (6, None, 'F', ''),
+        ])
+        self.client = APIClient()
+
+    def test_prefix_and_limit(self):
+        response = self.client.get('/api/lyrics/artists/', {'q': 'AL', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'artist': 'alpine', 'song_count': 2},
+            {'artist': 'Alpha', 'song_count': 1},
+        ])
+
+    def test_limit_without_prefix(self):
+        response = self.client.get('/api/lyrics/artists/', {'limit': 1})
+        self.assertEqual(response.json(), [{'artist': 'Alpha', 'song_count': 1}])
+
+    def test_all_names(self):
+        response = self.client.get('/api/lyrics/artists/')
+        self.assertEqual(response.json(), [None, 'Alpha', 'Alpine', 'Beta', 'alpine'])
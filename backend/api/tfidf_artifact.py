@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .feature_store import FeatureStore, write_feature_store
+
+# Pipeline outputs live next to db.sqlite3 unless overridden
+ARTIFACT_DIR = os.environ.get(
+    'LYRIFY_ARTIFACT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'artifacts')
+)
+TFIDF_DIR = os.path.join(ARTIFACT_DIR, 'tfidf')
+CURRENT_FILE = 'CURRENT'
+FORMAT_VERSION = 2
+
+VECTORIZER_PARAMS = {'max_df': 0.8, 'min_df': 3, 'ngram_range': (1, 2)}
+
+
+class TfidfArtifact:
+    """A fitted TF-IDF model together with the document matrix it produced.
+
+    ``matrix`` row ``i`` is the vector of lyric ``ids[i]``; column ``j`` is
+    ``feature_names[j]``. Loaded artifacts are backed by a memory-mapped
+    ``FeatureStore``.
+    """
+
+    def __init__(self, ids, matrix, feature_names, idf, params, version=None, path=None,
+                 store=None):
+        self.ids = ids
+        self.matrix = matrix
+        self._feature_names = feature_names
+        self.idf = idf
+        self.params = params
+        self.version = version
+        self.path = path
+        self.store = store
+        self._vectorizer = None
+
+    @property
+    def feature_names(self):
+        # Decoding the vocabulary is only needed to vectorize queries
+        if self._feature_names is None:
+            self._feature_names = self.store.feature_names
+        return self._feature_names
+
+    @property
+    def vectorizer(self):
+        # Rebuilt from the stored vocabulary and IDF instead of refitting, so
+        # query vectors are weighted exactly like the stored documents
+        if self._vectorizer is None:
+            vectorizer = TfidfVectorizer(
+                vocabulary={term: i for i, term in enumerate(self.feature_names)},
+                **self.params
+            )
+            vectorizer.idf_ = self.idf
+            self._vectorizer = vectorizer
+        return self._vectorizer
+
+    def transform(self, texts):
+        return self.vectorizer.transform(texts)
+
+
+def fit_artifact(ids, texts, params=None):
+    """Fit the shared vectorizer once over the whole corpus."""
+    params = dict(VECTORIZER_PARAMS if params is None else params)
+    vectorizer = TfidfVectorizer(**params)
+    matrix = vectorizer.fit_transform(texts).tocsr()
+    artifact = TfidfArtifact(
+        ids=np.asarray(ids, dtype=np.int64),
+        matrix=matrix,
+        feature_names=[str(term) for term in vectorizer.get_feature_names_out()],
+        idf=vectorizer.idf_.astype(np.float64),
+        params=params,
+    )
+    artifact._vectorizer = vectorizer
+    return artifact
+
+
+def _make_version(artifact):
+    digest = hashlib.sha1()
+    digest.update(artifact.ids.tobytes())
+    digest.update('\n'.join(artifact.feature_names).encode('utf-8'))
+    digest.update(json.dumps(artifact.params, sort_keys=True).encode('utf-8'))
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{digest.hexdigest()[:8]}"
+
+
+def save_artifact(artifact, root=TFIDF_DIR, extras=()):
+    """Write the artifact to ``root/<version>/`` and publish it as current.
+
+    Each of ``extras`` is called as ``extra(artifact, path)`` to add its own
+    files to the version directory before it is published.
+    """
+    version = _make_version(artifact)
+    final_path = os.path.join(root, version)
+    tmp_path = final_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    write_feature_store(tmp_path, artifact.ids, artifact.matrix, artifact.feature_names)
+    np.save(os.path.join(tmp_path, 'idf.npy'), artifact.idf)
+
+    meta = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'params': artifact.params,
+        'n_documents': int(artifact.matrix.shape[0]),
+        'n_features': int(artifact.matrix.shape[1]),
+        'nnz': int(artifact.matrix.nnz),
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    for extra in extras:
+        extra(artifact, tmp_path)
+
+    # Directory and pointer swaps are atomic, so readers never see a
+    # half-written version
+    os.replace(tmp_path, final_path)
+    publish_version(root, version)
+
+    artifact.version = version
+    artifact.path = final_path
+    return version
+
+
+def publish_version(root, version):
+    """Point ``root/CURRENT`` at ``version`` with an atomic rename."""
+    pointer_tmp = os.path.join(root, CURRENT_FILE + '.tmp')
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+
+def current_version(root=TFIDF_DIR):
+    """Return the published version name, or None before the first fit."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_artifact(version=None, root=TFIDF_DIR):
+    """Load a saved artifact, by default the currently published one."""
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(
+            f"No TF-IDF artifact published in {root}; run compute_tifidf.py first"
+        )
+    path = os.path.join(root, version)
+
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta['format'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported TF-IDF artifact format {meta['format']} in {path}")
+    params = dict(meta['params'])
+    params['ngram_range'] = tuple(params['ngram_range'])
+
+    store = FeatureStore(path)
+    return TfidfArtifact(
+        ids=store.ids,
+        matrix=store.matrix,
+        feature_names=None,
+        idf=np.load(os.path.join(path, 'idf.npy')),
+        params=params,
+        version=version,
+        path=path,
+        store=store,
+    )
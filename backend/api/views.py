@@ -3,15 +3,29 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import viewsets
 from rest_framework.pagination import PageNumberPagination
-from rest_framework import serializers
 from rest_framework.decorators import action
 from django.db.models import Q
 from .models import Lyrics, SongSimilarity
-from transformers import pipeline, AutoTokenizer
 from django.shortcuts import get_object_or_404
-from .serializers import LyricsSerializer
+from .serializers import LIST_FIELDS, LyricsSerializer, parse_fields
+from .sentiment import (
+    get_sentiment_model,
+    get_stored_sentiment,
+    sentiment_load_metrics,
+    store_sentiments,
+)
+from .batching import MicroBatcher
+from .admission import admission_controlled, admission_stats, busy_response, get_controller
+from .clustering import get_cluster_model, load_cluster_summary, sample_cluster
+from .neighbours import neighbour_cache
+from .search import search_count, search_lyrics
+from .pagination import KeysetPagination
+from .catalogue import catalogue_version, search_artists
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.conf import settings
 from django.db import connection
 from django.db.models import Count
+import hashlib
 import random
 
 # Create your views here.
@@ -20,22 +34,23 @@ import random
 def hello_world(request):
     return Response({"message": "Hello, World!"})
 
-class LyricsSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Lyrics
-        fields = ['id', 'artist', 'title', 'lyric', 'clean_lyrics']
-
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 15
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-# Initialize both tokenizer and sentiment analyzer
-tokenizer = AutoTokenizer.from_pretrained("siebert/sentiment-roberta-large-english")
-sentiment_analyzer = pipeline(
-    "sentiment-analysis",
-    model="siebert/sentiment-roberta-large-english",
-    return_all_scores=True
+def score_sentiment_batch(texts):
+    # The model is loaded by the first batch, not when this module is imported
+    scores, truncated = get_sentiment_model().score(texts)
+    return list(zip(scores, truncated))
+
+# Concurrent sentiment requests share forward passes instead of each
+# running a batch of one
+sentiment_batcher = MicroBatcher(
+    score_sentiment_batch,
+    max_batch_size=getattr(settings, 'SENTIMENT_BATCH_MAX_SIZE', 16),
+    max_wait_ms=getattr(settings, 'SENTIMENT_BATCH_MAX_WAIT_MS', 5),
+    name='sentiment-batcher',
 )
 
 class LyricsViewSet(viewsets.ModelViewSet):
@@ -43,6 +58,18 @@ class LyricsViewSet(viewsets.ModelViewSet):
     serializer_class = LyricsSerializer
     pagination_class = StandardResultsSetPagination
 
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or following a cursor link) seeks on an index
+        # instead of counting and skipping rows
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params if self.request is not None else {}
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         queryset = Lyrics.objects.all().order_by('id')
         search = self.request.query_params.get('search', None)
@@ -55,10 +82,103 @@ class LyricsViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # ?search_mode=fts ranks title/artist/lyric matches with the FTS5 index
+        search = request.query_params.get('search')
+        if search and request.query_params.get('search_mode') == 'fts':
+            return self.search_list(request, search)
+        
+        # Fast path: only the requested columns, as plain dicts from .values(),
+        # with no model instances or per-field serializer calls
+        fields = parse_fields(request.query_params.get('fields'), LIST_FIELDS)
+        # Pagination keys (id, and artist/title for keyset pages) are always fetched
+        columns = fields + tuple(f for f in ('id', 'artist', 'title') if f not in fields)
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        if len(columns) > len(fields):
+            rows = [{name: row[name] for name in fields} for row in rows]
+        if page is not None:
+            return self.get_paginated_response(rows)
+        return Response(rows)
+
+    def get_serializer(self, *args, **kwargs):
+        # ?fields= also trims single-song responses
+        if self.action == 'retrieve':
+            kwargs['fields'] = parse_fields(
+                self.request.query_params.get('fields'), LyricsSerializer.Meta.fields
+            )
+        return super().get_serializer(*args, **kwargs)
+
+    def search_list(self, request, search):
+        page_size = self.paginator.get_page_size(request)
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        artist = request.query_params.get('artist')
+        prefix = request.query_params.get('prefix', '1') != '0'
+        # One extra row tells us whether there is a next page without a COUNT
+        results = search_lyrics(
+            search,
+            limit=page_size + 1,
+            offset=(page - 1) * page_size,
+            artist=artist,
+            prefix=prefix,
+        )
+        # As on the keyset list, the total is only counted (and cached) on ?count=1
+        count = search_count(search, artist, prefix) if request.query_params.get('count') == '1' else None
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(url, 'page', page + 1) if len(results) > page_size else None
+        if page == 1:
+            previous_url = None
+        elif page == 2:
+            previous_url = remove_query_param(url, 'page')
+        else:
+            previous_url = replace_query_param(url, 'page', page - 1)
+        return Response({
+            'count': count,
+            'next': next_url,
+            'previous': previous_url,
+            'results': results[:page_size],
+        })
+
     @action(detail=False, methods=['get'])
     def artists(self, request):
-        artists = Lyrics.objects.values_list('artist', flat=True).distinct().order_by('artist')
-        return Response(list(artists))
+        # ?q= autocompletes on the catalogue (case- and accent-insensitive
+        # prefix, most songs first); without q or limit, all names as before
+        prefix = request.query_params.get('q')
+        limit = request.query_params.get('limit')
+        try:
+            limit = max(1, min(int(limit), 100)) if limit else (20 if prefix else None)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        
+        with connection.cursor() as cursor:
+            version = catalogue_version(cursor)
+            if version is None:
+                # Catalogue not built yet (`manage.py build_artist_catalogue`):
+                # same filter and shape from lyrics, without the accent folding
+                if not (prefix or limit):
+                    artists = Lyrics.objects.values_list('artist', flat=True).distinct().order_by('artist')
+                    return Response(list(artists))
+                rows = Lyrics.objects.filter(artist__isnull=False)
+                if prefix:
+                    rows = rows.filter(artist__istartswith=prefix.strip())
+                rows = rows.values('artist').annotate(song_count=Count('id'))
+                rows = rows.order_by('-song_count', 'artist') if prefix else rows.order_by('artist')
+                return Response(list(rows[:limit]))
+            
+            # The catalogue only changes when the pipeline rebuilds it
+            etag = '"{}"'.format(hashlib.sha1(
+                f"{version}|{request.GET.urlencode()}".encode('utf-8')
+            ).hexdigest())
+            if etag in request.headers.get('If-None-Match', ''):
+                return Response(status=304, headers={'ETag': etag})
+            
+            rows = search_artists(cursor, prefix, limit)
+        data = rows if prefix or limit else [row['artist'] for row in rows]
+        return Response(data, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
 
     @action(detail=True, methods=['get'])
     def sentiment(self, request, pk=None):
@@ -66,104 +186,85 @@ class LyricsViewSet(viewsets.ModelViewSet):
         if not lyric.clean_lyrics:
             return Response({"error": "No cleaned lyrics available"}, status=400)
         
+        # Scores precomputed by `manage.py precompute_sentiment`
+        stored = get_stored_sentiment(lyric.id)
+        if stored is not None:
+            return Response(stored)
+        
+        # Only live inference is admission-controlled; stored scores are cheap
+        controller = get_controller('sentiment')
+        if not controller.acquire():
+            return busy_response(controller)
         try:
-            # Tokenize and truncate the text
-            tokens = tokenizer(lyric.clean_lyrics, 
-                             truncation=True, 
-                             max_length=510, 
-                             return_tensors="pt")
-            
-            # Convert truncated tokens back to text
-            truncated_text = tokenizer.decode(tokens['input_ids'][0], 
-                                            skip_special_tokens=True)
+            # Batched with other requests arriving within a few milliseconds
+            results, truncated = sentiment_batcher(lyric.clean_lyrics)
             
-            # Analyze sentiment of truncated text
-            results = sentiment_analyzer(truncated_text)[0]
+            # Keep the live result so the next view of this song is a lookup
+            store_sentiments([(lyric.id, results, truncated)])
             
             return Response({
                 "sentiment_scores": results,
-                "truncated": len(lyric.clean_lyrics) != len(truncated_text)
+                "truncated": truncated
             })
         except Exception as e:
             return Response({"error": str(e)}, status=500)
+        finally:
+            controller.release()
+
+    @action(detail=False, methods=['get'])
+    def sentiment_stats(self, request):
+        return Response({**sentiment_batcher.stats(), 'model': sentiment_load_metrics()})
 
     @action(detail=True, methods=['get'])
     def similar(self, request, pk=None):
         try:
-            # Use direct SQL query with cursor for better control
-            with connection.cursor() as cursor:
-                cursor.execute('''
-                    SELECT 
-                        CASE 
-                            WHEN ss.song_id1 = %s THEN ss.song_id2
-                            ELSE ss.song_id1
-                        END as similar_song_id,
-                        l.title,
-                        l.artist,
-                        ss.similarity_score
-                    FROM song_similarities ss
-                    JOIN lyrics l ON (
-                        CASE 
-                            WHEN ss.song_id1 = %s THEN ss.song_id2
-                            ELSE ss.song_id1
-                        END = l.id
-                    )
-                    WHERE (ss.song_id1 = %s OR ss.song_id2 = %s)  -- Check both directions
-                    AND ss.similarity_score > 0  -- Ensure non-zero similarity
-                    AND ss.song_id1 != ss.song_id2  -- Exclude self-similarity
-                    ORDER BY ss.similarity_score DESC
-                    LIMIT 5
-                ''', [pk, pk, pk, pk])  # Pass pk four times for the different conditions
-                
-                # Convert the results to dictionaries
-                columns = [col[0] for col in cursor.description]
-                results = [
-                    dict(zip(columns, row))
-                    for row in cursor.fetchall()
-                ]
-
-                # Convert similarity scores to float
-                for result in results:
-                    result['similarity_score'] = float(result['similarity_score'])
-                    
-                # Debug information
-                print(f"Found {len(results)} similar songs for song_id {pk}")
-                if len(results) < 5:
-                    # Check why we got fewer results
-                    cursor.execute('''
-                        SELECT COUNT(*) 
-                        FROM song_similarities 
-                        WHERE (song_id1 = %s OR song_id2 = %s)
-                        AND similarity_score > 0
-                    ''', [pk, pk])
-                    total_similarities = cursor.fetchone()[0]
-                    print(f"Total similarities found in database: {total_similarities}")
-                
-                return Response(results)
-            
+            limit = min(int(request.query_params.get('limit', 5)), 50)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        
+        try:
+            # Pre-ranked neighbour list: a cache hit or one primary-key range scan
+            return Response(neighbour_cache.get(pk, limit))
         except Exception as e:
-            import traceback
-            print(f"Error in similar songs endpoint: {str(e)}")
-            print(traceback.format_exc())
             return Response(
                 {"error": "Failed to fetch similar songs", "details": str(e)}, 
                 status=500
             )
 
+    @action(detail=False, methods=['get'])
+    def similar_cache(self, request):
+        return Response(neighbour_cache.stats())
+
     @action(detail=False, methods=['get'])
     def cluster_songs(self, request):
         cluster_num = request.query_params.get('cluster', None)
         if cluster_num is None:
             return Response({"error": "Cluster number is required"}, status=400)
+        try:
+            cluster_num = int(cluster_num)
+            count = max(1, min(int(request.query_params.get('count', 20)), 100))
+        except ValueError:
+            return Response({"error": "cluster and count must be integers"}, status=400)
+        fields = parse_fields(request.query_params.get('fields'), LIST_FIELDS)
         
         try:
-            # Get 20 random songs from the specified cluster
-            songs = list(Lyrics.objects.filter(
-                cluster_label=cluster_num
-            ).values('id', 'artist', 'title', 'lyric', 'clean_lyrics')[:100])  # Added 'lyric' and 'clean_lyrics'
-            
-            # Randomly select 20 songs
-            selected_songs = random.sample(songs, min(20, len(songs)))
+            summary = load_cluster_summary()
+            if summary is None:
+                # Tables not built yet: sample the first 100 songs as before
+                songs = list(Lyrics.objects.filter(cluster_label=cluster_num).values(*fields)[:100])
+                selected_songs = random.sample(songs, min(count, len(songs)))
+            else:
+                cluster = summary.get(cluster_num)
+                # Uniform over the whole cluster, then only the requested columns
+                ids = sample_cluster(cluster_num, cluster['count'], count) if cluster else []
+                rows = {
+                    row['id']: row
+                    for row in Lyrics.objects.filter(id__in=ids).values(*set(fields) | {'id'})
+                }
+                selected_songs = [
+                    {name: rows[lyric_id][name] for name in fields}
+                    for lyric_id in ids if lyric_id in rows
+                ]
             
             return Response({
                 "cluster": cluster_num,
@@ -174,6 +275,11 @@ class LyricsViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def cluster_stats(self, request):
+        # Counts, top terms and representative song from the clustering stage
+        summary = load_cluster_summary()
+        if summary is not None:
+            return Response(list(summary.values()))
+        
         # Get counts for each cluster
         stats = Lyrics.objects.values('cluster_label').annotate(
             count=Count('id')
@@ -182,6 +288,37 @@ class LyricsViewSet(viewsets.ModelViewSet):
         return Response(list(stats))
 
     @action(detail=False, methods=['post'])
+    def assign_cluster(self, request):
+        # Accepts {"text": "..."} or {"texts": ["...", ...]}
+        texts = request.data.get('texts')
+        if texts is None:
+            text = request.data.get('text')
+            texts = [text] if text else []
+        if not texts or not all(isinstance(text, str) for text in texts):
+            return Response({"error": "Provide 'text' or a list of 'texts'"}, status=400)
+        
+        try:
+            artifact, clusters = get_cluster_model()
+        except FileNotFoundError as e:
+            return Response({"error": str(e)}, status=503)
+        
+        # All texts are placed with one sparse-dense product against the centroids
+        labels, distances = clusters.assign(artifact.transform(texts))
+        return Response([
+            {
+                "cluster": int(label),
+                "distance": float(distance),
+                "top_terms": clusters.top_terms[label][:10],
+            }
+            for label, distance in zip(labels, distances)
+        ])
+
+    @action(detail=False, methods=['get'])
+    def admission(self, request):
+        return Response(admission_stats())
+
+    @action(detail=False, methods=['post'])
+    @admission_controlled('recommend')
     def recommend(self, request):
         query = request.data.get('query', '')
         recommendations = self.queryset.model.get_recommendations(query)
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it compresses the final response body
+    "django.middleware.gzip.GZipMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -122,3 +124,55 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Add CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development!
+
+# Recommendation index: how often (seconds) each worker checks whether the
+# pipeline has published a new TF-IDF artifact, and how queries are scored:
+# 'brute' scores every song, 'inverted' prunes with the inverted index,
+# 'embeddings' ranks by LSA vectors from compute_embeddings.py, 'ann' uses
+# the IVF-PQ index from build_ann_index.py (None keeps the index's nprobe)
+RECOMMENDER_RELOAD_CHECK_SECONDS = 5
+RECOMMENDER_ENGINE = 'inverted'
+RECOMMENDER_ANN_NPROBE = None
+
+# Sentiment model and how its scores are computed (see `manage.py
+# precompute_sentiment`). SENTIMENT_MODEL_PATH replaces the hub model with
+# a local checkpoint directory, loaded without network access, and
+# SENTIMENT_QUANTIZATION = 'int8' dynamically quantizes it for CPU
+# (compare options with `manage.py benchmark_sentiment`). 'first' scores
+# the first 510 tokens; 'windows' scores the whole lyric as overlapping
+# 510-token windows starting every SENTIMENT_WINDOW_STRIDE tokens, weighted
+# by length. Stored scores are filed under a version key derived from all
+# of these; set SENTIMENT_MODEL_VERSION to override it
+SENTIMENT_MODEL = "siebert/sentiment-roberta-large-english"
+SENTIMENT_MODEL_PATH = None
+SENTIMENT_QUANTIZATION = None
+SENTIMENT_SCORING = 'windows'
+SENTIMENT_WINDOW_STRIDE = 384
+
+# Live sentiment requests are coalesced into one forward pass of up to
+# SENTIMENT_BATCH_MAX_SIZE lyrics, waiting at most this many milliseconds
+SENTIMENT_BATCH_MAX_SIZE = 16
+SENTIMENT_BATCH_MAX_WAIT_MS = 5
+
+# The sentiment model is loaded on first use. SENTIMENT_PRELOAD loads it
+# when the WSGI/ASGI application is created instead (with gunicorn
+# --preload, forked workers share the weights); SENTIMENT_WARMUP also runs
+# one forward pass at that point
+SENTIMENT_PRELOAD = False
+SENTIMENT_WARMUP = False
+
+# Concurrency limits for expensive LyricsViewSet actions: at most 'slots'
+# requests run at once per worker, 'queue' more wait up to 'timeout'
+# seconds, and the rest get a 503 with Retry-After straight away.
+# Sentiment requests hold their slot while waiting on the micro-batcher, so
+# it needs a full batch worth of slots or batches could never fill up
+ADMISSION_CONTROL = {
+    'sentiment': {'slots': SENTIMENT_BATCH_MAX_SIZE, 'queue': 2 * SENTIMENT_BATCH_MAX_SIZE, 'timeout': 2.0},
+    'recommend': {'slots': 4, 'queue': 16, 'timeout': 1.0},
+}
+ADMISSION_RETRY_AFTER_SECONDS = 1
+
+# Per-worker LRU cache in front of the `similar` action's neighbour lookups;
+# it is emptied when compute_similarity.py publishes a new neighbour store
+SIMILAR_CACHE_SIZE = 10000
+SIMILAR_CACHE_CHECK_SECONDS = 30
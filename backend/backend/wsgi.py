@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
 application = get_wsgi_application()
+
+# Optionally load the sentiment model before the server forks its workers
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'SENTIMENT_PRELOAD', False):
+    from api.sentiment import preload_sentiment_model
+
+    preload_sentiment_model(warmup=getattr(settings, 'SENTIMENT_WARMUP', False))
@@ -0,0 +1,76 @@
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+
+from clean_lyrics import clean_lyrics, download_nltk_data
+
+# A few fixed lyrics timed alongside the database sample. Equivalence with
+# the original cleaner is covered by api.tests.CleanLyricsTests.
+SAMPLE_LYRICS = [
+    "I'm gonna love you 'til the end of time, baby",
+    "You wanna dance? I cannot stop, gotta keep movin'",
+    "Café déjà vu, niño — ¿qué pasa?\tTab\r\nCRLF",
+    "Y'all ain't seen nothin' yet; we'll rock 'n' roll",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Time the regex and NLTK tokenizer paths of clean_lyrics().")
+    parser.add_argument('--db', default='backend/db.sqlite3', help='Path to the SQLite database')
+    parser.add_argument('--sample', type=int, default=1000,
+                        help='Random lyrics taken from the database (0 uses only the fixed samples)')
+    return parser.parse_args()
+
+
+def load_sample(db_path, size):
+    if size <= 0:
+        return []
+    try:
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(
+            "SELECT lyric FROM lyrics WHERE lyric IS NOT NULL ORDER BY RANDOM() LIMIT ?", (size,)
+        ).fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not read lyrics from {db_path} ({e}); using the fixed samples only")
+        return []
+    return [row[0] for row in rows]
+
+
+def time_per_document(clean, documents):
+    latencies = []
+    for document in documents:
+        start_time = time.perf_counter()
+        clean(document)
+        latencies.append(time.perf_counter() - start_time)
+    return np.asarray(latencies) * 1000
+
+
+def main():
+    args = parse_args()
+    download_nltk_data('nltk')
+
+    documents = SAMPLE_LYRICS + load_sample(args.db, args.sample)
+    print(f"Cleaning {len(documents)} documents...")
+
+    tokenizers = ('nltk', 'regex')
+    # Warm up lazy state (stopword set, NLTK models) outside the timings
+    for tokenizer in tokenizers:
+        clean_lyrics(SAMPLE_LYRICS[0], tokenizer)
+
+    results = {}
+    for tokenizer in tokenizers:
+        results[tokenizer] = time_per_document(lambda t: clean_lyrics(t, tokenizer), documents)
+
+    print("\nPer-document latency:")
+    for name, latencies in results.items():
+        print(f"  {name:>5}: mean {latencies.mean():7.3f}ms  p50 {np.percentile(latencies, 50):7.3f}ms  "
+              f"p95 {np.percentile(latencies, 95):7.3f}ms  "
+              f"({results['nltk'].sum() / latencies.sum():.1f}x vs nltk)")
+
+
+if __name__ == "__main__":
+    main()
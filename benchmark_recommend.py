@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(current_dir, 'backend')
+sys.path.append(backend_dir)
+
+from api.inverted_index import load_inverted_index
+from api.similarity import top_k
+from api.tfidf_artifact import load_artifact
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare inverted-index recommend queries with brute-force cosine.")
+    parser.add_argument('--queries', type=int, default=200, help='Number of sampled queries')
+    parser.add_argument('--terms', type=int, default=4, help='Terms per sampled query')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def sample_queries(store, n_queries, n_terms, rng):
+    """Short free-text queries made of terms taken from random songs."""
+    queries = []
+    while len(queries) < n_queries:
+        indices, _ = store.row_slice(int(rng.integers(store.n_rows)))
+        if len(indices) == 0:
+            continue
+        picked = rng.choice(np.asarray(indices), size=min(n_terms, len(indices)), replace=False)
+        queries.append(' '.join(store.term(int(j)) for j in picked))
+    return queries
+
+
+def brute_force(matrix, query_vector, k):
+    scores = (matrix @ query_vector.T).toarray().ravel()
+    positions = top_k(scores, k)
+    positions = positions[scores[positions] > 0]
+    return positions, scores[positions]
+
+
+def summarize(name, latencies):
+    latencies = np.asarray(latencies) * 1000
+    print(f"{name:>9}: mean {latencies.mean():7.3f}ms  p50 {np.percentile(latencies, 50):7.3f}ms  "
+          f"p95 {np.percentile(latencies, 95):7.3f}ms")
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    artifact = load_artifact()
+    matrix = artifact.matrix
+    start_time = time.perf_counter()
+    index = load_inverted_index(artifact)
+    print(f"TF-IDF artifact {artifact.version}: {matrix.shape[0]} songs, {matrix.nnz} postings "
+          f"(inverted index ready in {time.perf_counter() - start_time:.2f}s)")
+
+    queries = sample_queries(artifact.store, args.queries, args.terms, rng)
+    vectors = [artifact.transform([query]) for query in queries]
+
+    brute_latencies, inverted_latencies = [], []
+    touched_fraction, query_fraction = [], []
+    mismatches = 0
+    for query, vector in zip(queries, vectors):
+        start_time = time.perf_counter()
+        brute_positions, brute_scores = brute_force(matrix, vector, args.top_k)
+        brute_latencies.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        positions, scores, touched = index.search(vector, args.top_k)
+        inverted_latencies.append(time.perf_counter() - start_time)
+
+        # Ties may come back in a different order, so compare the scores and
+        # the ids that are not tied
+        same_scores = np.array_equal(brute_scores, scores)
+        untied = np.unique(brute_scores, return_counts=True)
+        untied = set(untied[0][untied[1] == 1].tolist())
+        same_ids = all(
+            a == b for a, b, score in zip(brute_positions, positions, brute_scores)
+            if score in untied
+        )
+        if not (same_scores and same_ids):
+            mismatches += 1
+            print(f"Mismatch for query {query!r}")
+
+        postings = int(sum(index.term_ptr[t + 1] - index.term_ptr[t] for t in vector.indices))
+        touched_fraction.append(touched / matrix.nnz)
+        query_fraction.append(touched / postings if postings else 0.0)
+
+    print(f"\n{len(queries)} queries of {args.terms} terms, top-{args.top_k}:")
+    summarize('brute', brute_latencies)
+    summarize('inverted', inverted_latencies)
+    print(f"Postings touched: {np.mean(query_fraction) * 100:.1f}% of the query terms' postings, "
+          f"{np.mean(touched_fraction) * 100:.3f}% of all postings")
+    print(f"Speedup: {np.sum(brute_latencies) / np.sum(inverted_latencies):.1f}x")
+    print(f"Results identical to brute force: {len(queries) - mismatches}/{len(queries)}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
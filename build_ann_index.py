@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(current_dir, 'backend')
+sys.path.append(backend_dir)
+
+from api.ann import IVFPQIndex, evaluate_recall, load_ann_index, save_ann_index
+from api.embeddings import load_embeddings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Build an IVF-PQ nearest-neighbour index over the song embeddings.")
+    parser.add_argument('--lists', type=int, default=None,
+                        help='Coarse lists (default: 4 * sqrt(songs))')
+    parser.add_argument('--subquantizers', type=int, default=16,
+                        help='PQ codes per song; must divide the embedding dimensions')
+    parser.add_argument('--train-size', type=int, default=100000, help='Songs sampled for training')
+    parser.add_argument('--nprobe', type=int, default=8, help='Default lists scanned per query')
+    parser.add_argument('--rerank', type=int, default=4,
+                        help='Rerank the best k * rerank candidates exactly (0 disables)')
+    parser.add_argument('--evaluate-only', action='store_true',
+                        help='Skip building and evaluate the published index')
+    parser.add_argument('--eval-queries', type=int, default=500,
+                        help='Songs used to measure recall (0 skips evaluation)')
+    parser.add_argument('--eval-nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32],
+                        help='nprobe values to evaluate')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    embeddings = load_embeddings()
+    vectors = embeddings.vectors
+    print(f"Using embeddings {embeddings.version} ({vectors.shape[0]} songs x {vectors.shape[1]} dims)")
+
+    if args.evaluate_only:
+        index = load_ann_index(embeddings)
+    else:
+        start_time = time.perf_counter()
+        index = IVFPQIndex.train(
+            vectors,
+            n_lists=args.lists,
+            m=args.subquantizers,
+            train_size=args.train_size,
+            seed=args.seed,
+            nprobe=args.nprobe,
+            rerank=args.rerank,
+        )
+        print(f"Trained and encoded {index.n_lists} lists x {index.m} codes "
+              f"in {time.perf_counter() - start_time:.2f}s")
+        version = save_ann_index(index, embeddings)
+        print(f"Saved ANN index {version} ({index.codes.nbytes / 2**20:.1f} MiB of codes)")
+
+    if args.eval_queries:
+        rng = np.random.default_rng(args.seed)
+        n_songs = vectors.shape[0]
+        sample = rng.choice(n_songs, size=min(args.eval_queries, n_songs), replace=False)
+        print(f"\nRecall@{args.top_k} against exact cosine over {len(sample)} songs:")
+        for nprobe in args.eval_nprobe:
+            recall, latency = evaluate_recall(index, vectors, sample, k=args.top_k, nprobe=nprobe)
+            print(f"  nprobe={nprobe:<4} recall {recall:.3f}  {latency * 1000:.3f}ms/query")
+
+
+if __name__ == "__main__":
+    main()
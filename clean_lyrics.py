@@ -1,20 +1,73 @@
-import sqlite3
-import sys
+import argparse
+import hashlib
 import os
 import re
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import contractions
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 
-# Download all required NLTK data
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('punkt_tab')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('wordnet')
+# Bump when clean_lyrics() changes so every row is cleaned again
+CLEANER_VERSION = 1
+
+# Precompiled once instead of on every call
+NON_ALPHA_PATTERN = re.compile(r'[^a-z\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Once only [a-z ] is left, word_tokenize still splits these words
+# (NLTK's Treebank contraction rules), so the regex mode splits them too
+TREEBANK_SPLITS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na'),
+}
 
-def clean_lyrics(text):
+_stopwords = None
+
+def lyric_stopwords():
+    # Custom stopwords for lyrics, built once per process from the local corpus
+    global _stopwords
+    if _stopwords is None:
+        custom_stopwords = set(stopwords.words('english')) - {'i', 'me', 'my', 'myself',
+                                                             'you', 'your', 'yours',
+                                                             'he', 'she', 'it',
+                                                             'no', 'not', 'never'}
+        additional_stopwords = {'la', 'oh', 'ooh', 'yeah', 'na', 'uh', 'woah', 'ah', 'hey', 'baby', 'whoa'}
+        custom_stopwords.update(additional_stopwords)
+        _stopwords = frozenset(custom_stopwords)
+    return _stopwords
+
+def download_nltk_data(tokenizer='regex'):
+    # Only fetch what is missing; importing this module never touches the network
+    resources = ['corpora/stopwords']
+    if tokenizer == 'nltk':
+        resources += ['tokenizers/punkt', 'tokenizers/punkt_tab']
+    for resource in resources:
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            nltk.download(resource.split('/')[1])
+
+def regex_tokenize(text):
+    # Same tokens as word_tokenize for text that is only lowercase letters and spaces
+    tokens = []
+    for word in text.split():
+        split = TREEBANK_SPLITS.get(word)
+        if split:
+            tokens.extend(split)
+        else:
+            tokens.append(word)
+    return tokens
+
+def clean_lyrics(text, tokenizer='regex'):
     # Convert to lowercase
     text = text.lower()
 
@@ -22,71 +75,128 @@ def clean_lyrics(text):
     text = contractions.fix(text)
 
     # Remove all special characters (including apostrophes)
-    text = re.sub(r'[^a-z\s]', ' ', text)
+    text = NON_ALPHA_PATTERN.sub(' ', text)
 
     # Replace multiple spaces with single space
-    text = re.sub(r'\s+', ' ', text)
-
-    # Custom stopwords for lyrics
-    custom_stopwords = set(stopwords.words('english')) - {'i', 'me', 'my', 'myself',
-                                                         'you', 'your', 'yours',
-                                                         'he', 'she', 'it',
-                                                         'no', 'not', 'never'}
-    additional_stopwords = {'la', 'oh', 'ooh', 'yeah', 'na', 'uh', 'woah', 'ah', 'hey', 'baby', 'whoa'}
-    custom_stopwords.update(additional_stopwords)
+    text = WHITESPACE_PATTERN.sub(' ', text)
 
     # Tokenize and remove stopwords
-    tokens = word_tokenize(text)
+    if tokenizer == 'nltk':
+        tokens = word_tokenize(text)
+    else:
+        tokens = regex_tokenize(text)
+    custom_stopwords = lyric_stopwords()
     tokens = [word for word in tokens if word not in custom_stopwords]
 
-    # Join tokens back into text
-    text = ' '.join(tokens)
+    # Join tokens back into text (no leading or trailing whitespace is left)
+    return ' '.join(tokens)
+
+def content_hash(lyric):
+    # Identifies the lyric text and the cleaner that produced clean_lyrics
+    return hashlib.sha1(f"{CLEANER_VERSION}:{lyric}".encode('utf-8')).hexdigest()
 
-    # Final cleanup of any remaining whitespace
-    text = text.strip()
+def clean_chunk(rows, tokenizer='regex'):
+    # Runs in a worker process: rows are (id, lyric, hash) tuples
+    return [(clean_lyrics(lyric, tokenizer), lyric_hash, lyric_id) for lyric_id, lyric, lyric_hash in rows]
 
-    return text
+def iter_chunks(conn, chunk_size):
+    # Keyset pagination, so no read cursor stays open while we write
+    last_id = -1
+    while True:
+        rows = conn.execute(
+            "SELECT id, lyric, clean_hash FROM lyrics WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean new or edited lyrics into lyrics.clean_lyrics.")
+    parser.add_argument('--db', default='backend/db.sqlite3', help='Path to the SQLite database')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Rows read and cleaned per task')
+    parser.add_argument('--commit-every', type=int, default=50000, help='Rows written per transaction')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='Clean every row, even unchanged ones')
+    parser.add_argument('--tokenizer', choices=['regex', 'nltk'], default='regex',
+                        help='regex is a fast split with identical output; nltk uses word_tokenize')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    download_nltk_data(args.tokenizer)
+
     # Path to your SQLite database
-    db_path = 'backend/db.sqlite3'
-    
+    db_path = args.db
+    conn = None
+
     # First, alter the table to add the new column if it doesn't exist
     try:
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
-        
+
         # Check if column exists
         cursor.execute("PRAGMA table_info(lyrics)")
         columns = [column[1] for column in cursor.fetchall()]
-        
+
         if 'clean_lyrics' not in columns:
             cursor.execute("ALTER TABLE lyrics ADD COLUMN clean_lyrics TEXT")
             print("Added clean_lyrics column to the table")
-        
-        # Get all lyrics
-        cursor.execute("SELECT id, lyric FROM lyrics")
-        lyrics_data = cursor.fetchall()
-        
-        # Update each record with cleaned lyrics
-        for lyric_id, lyric in lyrics_data:
-            if lyric:
-                clean_lyric = clean_lyrics(lyric)
-                cursor.execute(
-                    "UPDATE lyrics SET clean_lyrics = ? WHERE id = ?",
-                    (clean_lyric, lyric_id)
-                )
-                print(f"Updated lyrics ID: {lyric_id}")
-        
+        if 'clean_hash' not in columns:
+            cursor.execute("ALTER TABLE lyrics ADD COLUMN clean_hash TEXT")
+            print("Added clean_hash column to the table")
+        conn.commit()
+
+        workers = args.workers or os.cpu_count() or 1
+        start_time = time.perf_counter()
+        scanned = cleaned = uncommitted = 0
+
+        def write(results):
+            nonlocal cleaned, uncommitted
+            cursor.executemany(
+                "UPDATE lyrics SET clean_lyrics = ?, clean_hash = ? WHERE id = ?",
+                results
+            )
+            cleaned += len(results)
+            uncommitted += len(results)
+            if uncommitted >= args.commit_every:
+                conn.commit()
+                uncommitted = 0
+            elapsed = time.perf_counter() - start_time
+            print(f"Cleaned {cleaned} of {scanned} scanned rows ({cleaned / elapsed:,.0f} rows/s)")
+
+        # Stream rows in chunks; only new or edited lyrics go to the pool
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for rows in iter_chunks(conn, args.chunk_size):
+                scanned += len(rows)
+                changed = []
+                for lyric_id, lyric, old_hash in rows:
+                    if not lyric:
+                        continue
+                    lyric_hash = content_hash(lyric)
+                    if args.force or lyric_hash != old_hash:
+                        changed.append((lyric_id, lyric, lyric_hash))
+                if changed:
+                    pending.append(pool.submit(clean_chunk, changed, args.tokenizer))
+                while len(pending) >= 2 * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
         conn.commit()
-        print("All lyrics have been cleaned and updated")
-        
+        elapsed = time.perf_counter() - start_time
+        print(f"All lyrics have been cleaned and updated: {cleaned} cleaned, "
+              f"{scanned - cleaned} unchanged or empty, {elapsed:.1f}s "
+              f"({cleaned / max(elapsed, 1e-9):,.0f} rows/s)")
+
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
-    
+
     finally:
         if conn:
             conn.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
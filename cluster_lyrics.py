@@ -1,5 +1,8 @@
+import argparse
 import sys
 import os
+import time
+from contextlib import contextmanager
 
 # Add the backend directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -8,7 +11,6 @@ sys.path.append(backend_dir)
 
 import django
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
 from collections import Counter
 
@@ -17,52 +19,146 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
 # Import after Django setup
-from api.models import Lyrics
+from api.clustering import (
+    ClusterModel,
+    build_cluster_tables,
+    centroid_top_terms,
+    fit_minibatch_kmeans,
+    fit_streaming_kmeans,
+    nearest_per_cluster,
+    predict_in_chunks,
+    save_cluster_model,
+    write_cluster_labels,
+)
+from api.embeddings import load_embeddings
+from api.tfidf_artifact import load_artifact
 
-def apply_clustering():
-    # Fetch data from database
-    lyrics_data = list(Lyrics.objects.all().values('id', 'clean_lyrics'))
-    df = pd.DataFrame(lyrics_data)
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def rss_mb():
+    # Current resident set size of this process in MB, or None where there
+    # is no /proc (macOS, Windows)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return None
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+@contextmanager
+def phase(name):
+    # Log wall-clock time, resident memory and peak memory for one step;
+    # memory figures the platform cannot report are left out
+    start_time = time.perf_counter()
+    start_rss = rss_mb()
+    yield
+    message = f"[{name}] {time.perf_counter() - start_time:.2f}s"
+    end_rss = rss_mb()
+    if start_rss is not None and end_rss is not None:
+        message += f", rss {end_rss:,.0f} MB ({end_rss - start_rss:+,.0f} MB)"
+    peak_mb = peak_rss_mb()
+    if peak_mb is not None:
+        message += f", peak {peak_mb:,.0f} MB"
+    print(message)
+
+def apply_clustering(args):
+    # Load the TF-IDF matrix published by compute_tifidf.py
+    with phase('load'):
+        artifact = load_artifact()
+        df = pd.DataFrame({'id': artifact.ids})
+        tfidf_matrix = artifact.matrix
     
-    print(f"Processing {len(df)} lyrics records...")
+    print(f"Processing {len(df)} lyrics records (TF-IDF artifact {artifact.version})...")
     
-    # Perform TF-IDF vectorization
-    vectorizer = TfidfVectorizer(max_df=0.8, min_df=3, ngram_range=(1, 2))
-    tfidf_matrix = vectorizer.fit_transform(df['clean_lyrics'].fillna(''))
+    # Optionally cluster the compact LSA vectors instead
+    embeddings = None
+    if args.embeddings:
+        with phase('load embeddings'):
+            embeddings = load_embeddings(tfidf_version=artifact.version)
+            tfidf_matrix = embeddings.vectors
+        print(f"Using {embeddings.n_components}-dimensional embeddings {embeddings.version}")
     
-    # Perform KMeans clustering
-    km = KMeans(
-        n_clusters=13,
-        max_iter=10000,
-        n_init=50,
-        random_state=42
-    ).fit(tfidf_matrix)
+    with phase(f'fit {args.algorithm}'):
+        if args.algorithm == 'kmeans':
+            # Full KMeans over the whole matrix, as originally run
+            km = KMeans(
+                n_clusters=args.clusters,
+                max_iter=10000,
+                n_init=args.n_init,
+                random_state=args.seed
+            ).fit(tfidf_matrix)
+        elif args.algorithm == 'minibatch':
+            km = fit_minibatch_kmeans(
+                tfidf_matrix, args.clusters, n_init=args.n_init, batch_size=args.batch_size,
+                seed=args.seed, n_jobs=args.jobs
+            )
+        else:
+            km = fit_streaming_kmeans(
+                tfidf_matrix, args.clusters, chunk_size=args.chunk_size, epochs=args.epochs,
+                batch_size=args.batch_size, seed=args.seed
+            )
     
-    # Create a dictionary mapping id to cluster label
-    cluster_assignments = dict(zip(df['id'], km.labels_))
+    top_terms = centroid_top_terms(
+        km.cluster_centers_, artifact.feature_names,
+        components=embeddings.components if embeddings is not None else None
+    )
+    model = ClusterModel(
+        km.cluster_centers_, 'embeddings' if embeddings is not None else 'tfidf', top_terms,
+        artifact.version, embeddings=embeddings
+    )
+    
+    # Same distance computation label_new_songs uses, so the representatives
+    # it compares against are in the same (squared, same-space) units
+    with phase('assign'):
+        labels, sq_distances = predict_in_chunks(model, tfidf_matrix, args.chunk_size)
     
     # Print cluster distribution
-    print("Cluster distribution:", Counter(km.labels_))
+    print(f"Inertia: {sq_distances.sum():,.2f}")
+    sizes = Counter(labels.tolist())
+    print("Cluster distribution:", sizes)
     
-    # Update database records
-    print("Updating database records...")
+    # Keep the centroids next to the vectorizer so new songs and queries can be labelled
+    with phase('save centroids'):
+        model.sizes = [sizes.get(c, 0) for c in range(args.clusters)]
+        path = save_cluster_model(model, artifact)
+    print(f"Saved centroids to {path}")
+    for cluster, terms in enumerate(top_terms):
+        print(f"  cluster {cluster}: {', '.join(terms[:8])}")
     
-    # First, add cluster column if it doesn't exist
-    try:
-        from django.db import connection
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                ALTER TABLE lyrics 
-                ADD COLUMN cluster_label INTEGER DEFAULT NULL
-            """)
-    except Exception as e:
-        print("Column might already exist or other error:", e)
+    # One transaction: labels go into a temp table and are applied with a single UPDATE
+    print("Updating database records...")
+    with phase('write labels'):
+        updated = write_cluster_labels(df['id'].to_numpy(), labels)
     
-    # Update records with cluster labels
-    for lyric_id, cluster_label in cluster_assignments.items():
-        Lyrics.objects.filter(id=lyric_id).update(cluster_label=cluster_label)
+    # Membership and summary tables behind the cluster endpoints
+    with phase('cluster tables'):
+        representatives = nearest_per_cluster(df['id'].to_numpy(), labels, sq_distances)
+        build_cluster_tables(top_terms, representatives)
     
-    print("Clustering complete and labels saved to database!")
+    print(f"Clustering complete and labels saved to database for {updated} songs!")
 
 if __name__ == "__main__":
-    apply_clustering()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cluster lyrics and store each song's label.")
+    parser.add_argument('--embeddings', action='store_true',
+                        help='Cluster dense LSA embeddings from compute_embeddings.py instead of TF-IDF')
+    parser.add_argument('--algorithm', choices=['minibatch', 'streaming', 'kmeans'], default='minibatch',
+                        help='minibatch: MiniBatchKMeans with parallel inits; streaming: partial_fit '
+                             'over row chunks; kmeans: full KMeans')
+    parser.add_argument('--clusters', type=int, default=13)
+    parser.add_argument('--n-init', type=int, default=8, help='Restarts (run in parallel for minibatch)')
+    parser.add_argument('--batch-size', type=int, default=4096, help='MiniBatchKMeans batch size')
+    parser.add_argument('--chunk-size', type=int, default=20000,
+                        help='Rows per partial_fit / prediction chunk')
+    parser.add_argument('--epochs', type=int, default=3, help='Passes over the data in streaming mode')
+    parser.add_argument('--jobs', type=int, default=-1, help='Parallel inits (-1: all cores)')
+    parser.add_argument('--seed', type=int, default=42)
+    apply_clustering(parser.parse_args())
@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(current_dir, 'backend')
+sys.path.append(backend_dir)
+
+from api.embeddings import fit_embeddings, save_embeddings
+from api.similarity import top_k
+from api.tfidf_artifact import load_artifact
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Reduce the TF-IDF matrix to dense LSA song embeddings.")
+    parser.add_argument('--dims', type=int, default=256, help='Embedding dimensions')
+    parser.add_argument('--n-iter', type=int, default=5, help='Randomized SVD power iterations')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--compare', action='store_true',
+                        help='Compare neighbours and clustering against the sparse TF-IDF path')
+    parser.add_argument('--sample', type=int, default=2000,
+                        help='Songs sampled for --compare')
+    parser.add_argument('--top-k', type=int, default=10, help='Neighbours compared per song')
+    parser.add_argument('--clusters', type=int, default=13, help='k used for the clustering comparison')
+    return parser.parse_args()
+
+
+def compare_neighbours(matrix, vectors, sample, k):
+    start_time = time.perf_counter()
+    sparse_scores = (matrix[sample] @ matrix.T).toarray()
+    sparse_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    dense_scores = np.asarray(vectors[sample]) @ np.asarray(vectors).T
+    dense_time = time.perf_counter() - start_time
+
+    recalls = []
+    for row, position in enumerate(sample):
+        sparse_scores[row, position] = -np.inf
+        dense_scores[row, position] = -np.inf
+        expected = set(top_k(sparse_scores[row], k).tolist())
+        found = set(top_k(dense_scores[row], k).tolist())
+        recalls.append(len(expected & found) / max(len(expected), 1))
+
+    print(f"\nNeighbours ({len(sample)} songs, top-{k}):")
+    print(f"  sparse TF-IDF scoring: {sparse_time:.2f}s")
+    print(f"  embedding scoring:     {dense_time:.2f}s")
+    print(f"  recall@{k} of embedding neighbours vs TF-IDF: {np.mean(recalls):.3f}")
+
+
+def compare_clustering(matrix, vectors, sample, n_clusters, seed):
+    results = {}
+    for name, data in (('sparse TF-IDF', matrix[sample]), ('embeddings', np.asarray(vectors[sample]))):
+        start_time = time.perf_counter()
+        km = KMeans(n_clusters=n_clusters, n_init=1, random_state=seed).fit(data)
+        elapsed = time.perf_counter() - start_time
+        silhouette = silhouette_score(data, km.labels_, metric='cosine', random_state=seed)
+        results[name] = km.labels_
+        print(f"  {name:<14} KMeans: {elapsed:6.2f}s, silhouette (cosine) {silhouette:.3f}")
+    agreement = adjusted_rand_score(results['sparse TF-IDF'], results['embeddings'])
+    print(f"  Adjusted Rand index between the two labelings: {agreement:.3f}")
+
+
+def main():
+    args = parse_args()
+
+    artifact = load_artifact()
+    print(f"Reducing TF-IDF artifact {artifact.version} "
+          f"({artifact.matrix.shape[0]} songs x {artifact.matrix.shape[1]} features) "
+          f"to {args.dims} dimensions...")
+
+    start_time = time.perf_counter()
+    embeddings = fit_embeddings(artifact, n_components=args.dims, n_iter=args.n_iter, seed=args.seed)
+    print(f"Fitted randomized SVD in {time.perf_counter() - start_time:.2f}s "
+          f"(explained variance {embeddings.explained_variance:.3f})")
+
+    version = save_embeddings(embeddings)
+    size_mb = embeddings.vectors.nbytes / 2**20
+    print(f"Saved embeddings {version} ({size_mb:.1f} MiB float32) to {embeddings.path}")
+
+    if args.compare:
+        rng = np.random.default_rng(args.seed)
+        n_songs = artifact.matrix.shape[0]
+        sample = np.sort(rng.choice(n_songs, size=min(args.sample, n_songs), replace=False))
+        compare_neighbours(artifact.matrix, embeddings.vectors, sample, args.top_k)
+        print(f"\nClustering ({len(sample)} songs, k={args.clusters}):")
+        compare_clustering(artifact.matrix, embeddings.vectors, sample, args.clusters, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,195 @@
+import argparse
+import os
 import sqlite3
-import pandas as pd
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-
-# Connect to your SQLite database
-db_path = 'backend/db.sqlite3'
-conn = sqlite3.connect(db_path)
-
-# First, drop the existing table if it exists
-conn.execute("DROP TABLE IF EXISTS song_similarities")
-conn.commit()
-
-# Read lyrics data
-query = "SELECT CAST(id AS INTEGER) as id, clean_lyrics FROM lyrics"
-df = pd.read_sql_query(query, conn, index_col='id')
-
-# Create TF-IDF matrix (recomputing it here, but you could also load from tfidf_features if needed)
-vectorizer = TfidfVectorizer(max_df=0.8, min_df=3, ngram_range=(1, 2))
-tfidf_matrix = vectorizer.fit_transform(df['clean_lyrics'].fillna(''))
-
-# Compute cosine similarity
-doc_sim = cosine_similarity(tfidf_matrix)
-
-# Create the similarities table
-create_table_query = """
-CREATE TABLE IF NOT EXISTS song_similarities (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    song_id1 INTEGER NOT NULL,
-    song_id2 INTEGER NOT NULL,
-    similarity_score REAL NOT NULL,
-    FOREIGN KEY (song_id1) REFERENCES lyrics (id),
-    FOREIGN KEY (song_id2) REFERENCES lyrics (id)
-)
-"""
-conn.execute(create_table_query)
-
-# Prepare data for insertion
-data_to_insert = []
-threshold = 0.0  # Adjust this to filter out low similarities if desired
-
-# Get original song IDs
-song_ids = df.index.tolist()
-
-# Iterate through the similarity matrix
-for i in range(len(doc_sim)):
-    for j in range(i + 1):  # Only store lower triangle including diagonal
-        similarity = doc_sim[i, j]
-        if similarity > threshold:
-            data_to_insert.append((
-                int(song_ids[i]),  # song_id1
-                int(song_ids[j]),  # song_id2
-                float(similarity)   # similarity_score
-            ))
-
-# Insert data in batches
-batch_size = 1000
-for i in range(0, len(data_to_insert), batch_size):
-    batch = data_to_insert[i:i + batch_size]
-    conn.executemany(
-        "INSERT INTO song_similarities (song_id1, song_id2, similarity_score) VALUES (?, ?, ?)",
-        batch
+import sys
+import time
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(current_dir, 'backend')
+sys.path.append(backend_dir)
+
+from api.ann import iter_ann_topk, load_ann_index
+from api.embeddings import load_embeddings
+from api.similarity import iter_topk, default_block_size
+from api.tfidf_artifact import load_artifact
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Store each song's top-K most similar songs.")
+    parser.add_argument('--db', default='backend/db.sqlite3', help='Path to the SQLite database')
+    parser.add_argument('--top-k', type=int, default=20, help='Neighbours kept per song')
+    parser.add_argument('--min-score', type=float, default=0.0,
+                        help='Only keep neighbours scoring above this')
+    parser.add_argument('--block-size', type=int, default=None,
+                        help='Rows multiplied per block (default: derived from --mem-budget-mb)')
+    parser.add_argument('--mem-budget-mb', type=int, default=256,
+                        help='Memory budget for one dense score block, per worker')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--embeddings', action='store_true',
+                        help='Score dense LSA embeddings from compute_embeddings.py instead of TF-IDF')
+    parser.add_argument('--ann', action='store_true',
+                        help='Find neighbours with the IVF-PQ index from build_ann_index.py (implies --embeddings)')
+    parser.add_argument('--nprobe', type=int, default=None, help='Lists scanned per song with --ann')
+    return parser.parse_args()
+
+
+def build_neighbour_store(conn, top_k, version):
+    """Rebuild song_neighbours from song_similarities, then swap it in.
+
+    Each directed pair also counts for the other song, so a song lists the
+    songs it is close to even when it is outside their own top K. Every
+    song keeps its best ``top_k``, ranked 1..K under a (song_id, rank)
+    primary key in a WITHOUT ROWID table: the `similar` endpoint reads one
+    contiguous key range.
+    """
+    conn.execute("DROP TABLE IF EXISTS song_neighbours_new")
+    conn.execute("""
+    CREATE TABLE song_neighbours_new (
+        song_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        neighbour_id INTEGER NOT NULL,
+        similarity_score REAL NOT NULL,
+        PRIMARY KEY (song_id, rank)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    INSERT INTO song_neighbours_new (song_id, rank, neighbour_id, similarity_score)
+    SELECT song_id, rank, neighbour_id, similarity_score FROM (
+        SELECT song_id, neighbour_id, similarity_score,
+               ROW_NUMBER() OVER (
+                   PARTITION BY song_id ORDER BY similarity_score DESC, neighbour_id
+               ) AS rank
+        FROM (
+            SELECT song_id, neighbour_id, MAX(similarity_score) AS similarity_score
+            FROM (
+                SELECT song_id1 AS song_id, song_id2 AS neighbour_id, similarity_score
+                FROM song_similarities
+                UNION ALL
+                SELECT song_id2, song_id1, similarity_score FROM song_similarities
+            )
+            WHERE song_id != neighbour_id AND similarity_score > 0
+            GROUP BY song_id, neighbour_id
+        )
     )
+    WHERE rank <= ?
+    """, (top_k,))
+    rows = conn.execute("SELECT COUNT(*) FROM song_neighbours_new").fetchone()[0]
+
+    # Swap in and bump the version so API workers drop their cached lists
+    conn.execute("DROP TABLE IF EXISTS song_neighbours")
+    conn.execute("ALTER TABLE song_neighbours_new RENAME TO song_neighbours")
+    conn.execute("CREATE TABLE IF NOT EXISTS song_neighbours_meta (version TEXT NOT NULL)")
+    conn.execute("DELETE FROM song_neighbours_meta")
+    conn.execute("INSERT INTO song_neighbours_meta (version) VALUES (?)",
+                 (f"{version}:{time.strftime('%Y%m%dT%H%M%S')}",))
     conn.commit()
+    return rows
+
+
+def main():
+    args = parse_args()
+
+    # Connect to your SQLite database
+    conn = sqlite3.connect(args.db)
+
+    # First, drop the existing table if it exists
+    conn.execute("DROP TABLE IF EXISTS song_similarities")
+    conn.commit()
+
+    # Load the TF-IDF matrix published by compute_tifidf.py
+    artifact = load_artifact()
+    tfidf_matrix = artifact.matrix
+    print(f"Using TF-IDF artifact {artifact.version}")
+    if args.embeddings or args.ann:
+        embeddings = load_embeddings(tfidf_version=artifact.version)
+        tfidf_matrix = embeddings.vectors
+        print(f"Using {embeddings.n_components}-dimensional embeddings {embeddings.version}")
+
+    # Create the similarities table. Rows are directed: song_id2 is one of
+    # the top-K neighbours of song_id1.
+    create_table_query = """
+    CREATE TABLE IF NOT EXISTS song_similarities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        song_id1 INTEGER NOT NULL,
+        song_id2 INTEGER NOT NULL,
+        similarity_score REAL NOT NULL,
+        FOREIGN KEY (song_id1) REFERENCES lyrics (id),
+        FOREIGN KEY (song_id2) REFERENCES lyrics (id)
+    )
+    """
+    conn.execute(create_table_query)
+
+    # Get original song IDs
+    song_ids = artifact.ids
+    n_songs = len(song_ids)
+    block_size = args.block_size or default_block_size(n_songs, args.mem_budget_mb)
+    print(f"Computing top-{args.top_k} neighbours for {n_songs} songs "
+          f"in blocks of {block_size} rows...")
+
+    # Stream each block of neighbours straight into the table
+    start_time = time.perf_counter()
+    done = 0
+    pairs = 0
+    if args.ann:
+        blocks = iter_ann_topk(
+            load_ann_index(embeddings),
+            k=args.top_k,
+            min_score=args.min_score,
+            nprobe=args.nprobe,
+            block_size=block_size,
+        )
+    else:
+        blocks = iter_topk(
+            tfidf_matrix,
+            k=args.top_k,
+            min_score=args.min_score,
+            block_size=block_size,
+            n_jobs=args.jobs,
+        )
+    for sources, neighbours, scores in blocks:
+        conn.executemany(
+            "INSERT INTO song_similarities (song_id1, song_id2, similarity_score) VALUES (?, ?, ?)",
+            zip(song_ids[sources].tolist(), song_ids[neighbours].tolist(), scores.tolist())
+        )
+        conn.commit()
+
+        done = min(done + block_size, n_songs)
+        pairs += len(scores)
+        elapsed = time.perf_counter() - start_time
+        print(f"Processed {done}/{n_songs} songs, {pairs} pairs "
+              f"({done / elapsed:,.0f} songs/s)")
+
+    # Create indices for better query performance
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_song_id1_score ON song_similarities (song_id1, similarity_score DESC)")
+    conn.commit()
+
+    build_start = time.perf_counter()
+    neighbours = build_neighbour_store(conn, args.top_k, artifact.version)
+    print(f"Built ranked neighbour store with {neighbours} rows "
+          f"in {time.perf_counter() - build_start:.1f}s")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\nStored {pairs} pairs for {n_songs} songs in {elapsed:.1f}s "
+          f"({n_songs / max(elapsed, 1e-9):,.0f} songs/s, {pairs / max(elapsed, 1e-9):,.0f} pairs/s)")
+
+    # Verify some data
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT s.*, l1.title as song1_title, l2.title as song2_title
+    FROM song_similarities s
+    JOIN lyrics l1 ON s.song_id1 = l1.id
+    JOIN lyrics l2 ON s.song_id2 = l2.id
+    LIMIT 5
+    """)
+    print("\nVerifying first 5 rows:")
+    for row in cursor.fetchall():
+        print(row)
+
+    conn.close()
+
+    print("Song similarities have been successfully stored in the database.")
+
 
-# Create indices for better query performance
-conn.execute("CREATE INDEX IF NOT EXISTS idx_song_id1 ON song_similarities (song_id1)")
-conn.execute("CREATE INDEX IF NOT EXISTS idx_song_id2 ON song_similarities (song_id2)")
-conn.execute("CREATE INDEX IF NOT EXISTS idx_similarity ON song_similarities (similarity_score)")
-
-# Verify some data
-cursor = conn.cursor()
-cursor.execute("""
-SELECT s.*, l1.title as song1_title, l2.title as song2_title 
-FROM song_similarities s
-JOIN lyrics l1 ON s.song_id1 = l1.id
-JOIN lyrics l2 ON s.song_id2 = l2.id
-LIMIT 5
-""")
-print("\nVerifying first 5 rows:")
-for row in cursor.fetchall():
-    print(row)
-
-conn.close()
-
-print("Song similarities have been successfully stored in the database.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,53 @@
+import os
 import sqlite3
+import sys
+import time
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(current_dir, 'backend')
+sys.path.append(backend_dir)
+
+from api.inverted_index import save_inverted_index
+from api.tfidf_artifact import fit_artifact, save_artifact, load_artifact
 
 # Connect to your SQLite database
 db_path = 'backend/db.sqlite3'
 conn = sqlite3.connect(db_path)
 
-# First, drop the existing table if it exists
-conn.execute("DROP TABLE IF EXISTS tfidf_features")
-conn.commit()
-
 # Read lyrics data - explicitly convert id to integer
 query = "SELECT CAST(id AS INTEGER) as id, clean_lyrics FROM lyrics"
 df = pd.read_sql_query(query, conn, index_col='id')
 
-# Fill NaN values and create TF-IDF matrix
-vectorizer = TfidfVectorizer(max_df=0.8, min_df=3, ngram_range=(1, 2))
-tfidf_matrix = vectorizer.fit_transform(df['clean_lyrics'].fillna(''))
-
-# Get feature names
-feature_names = vectorizer.get_feature_names_out()
-
-# Create the tfidf_features table with explicit INTEGER type
-create_table_query = """
-CREATE TABLE IF NOT EXISTS tfidf_features (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    lyric_id INTEGER NOT NULL,
-    feature_name TEXT NOT NULL,
-    tfidf_value REAL NOT NULL,
-    FOREIGN KEY (lyric_id) REFERENCES lyrics (id)
-)
-"""
-conn.execute(create_table_query)
-
-# Convert sparse matrix to coordinate format
-coo = tfidf_matrix.tocoo()
+# Fill NaN values and fit the TF-IDF model once for the whole pipeline
+artifact = fit_artifact(df.index, df['clean_lyrics'].fillna(''))
 
-# Prepare data for insertion
-data_to_insert = []
-for i, j, v in zip(coo.row, coo.col, coo.data):
-    # Only store non-zero values
-    if v > 0:
-        original_id = int(df.index[i])  # Explicitly cast to int
-        data_to_insert.append((
-            original_id,      # lyric_id
-            feature_names[j], # feature_name
-            float(v)         # tfidf_value
-        ))
-
-# Insert data in batches
-batch_size = 1000
-for i in range(0, len(data_to_insert), batch_size):
-    batch = data_to_insert[i:i + batch_size]
-    conn.executemany(
-        "INSERT INTO tfidf_features (lyric_id, feature_name, tfidf_value) VALUES (?, ?, ?)",
-        batch
-    )
-    conn.commit()
-
-# Create indices for better query performance
-conn.execute("CREATE INDEX IF NOT EXISTS idx_lyric_id ON tfidf_features (lyric_id)")
-conn.execute("CREATE INDEX IF NOT EXISTS idx_feature_name ON tfidf_features (feature_name)")
-
-# Verify some data
-cursor = conn.cursor()
-cursor.execute("SELECT * FROM tfidf_features LIMIT 5")
-print("\nVerifying first 5 rows:")
-for row in cursor.fetchall():
-    print(row)
+# Publish vocabulary, IDF and matrix for the other stages and the API.
+# The matrix is streamed in row blocks into a memory-mapped feature store,
+# next to impact-ordered posting lists for free-text recommend queries;
+# both are written before the version is published.
+start_time = time.perf_counter()
+version = save_artifact(artifact, extras=[save_inverted_index])
+print(f"Saved TF-IDF artifact {version} with its inverted index to {artifact.path} "
+      f"in {time.perf_counter() - start_time:.2f}s")
 
+# The feature store replaces the one-row-per-nonzero tfidf_features table
+conn.execute("DROP TABLE IF EXISTS tfidf_features")
+conn.commit()
 conn.close()
 
-print("TF-IDF features have been successfully stored in the database.")
\ No newline at end of file
+# Verify some data
+start_time = time.perf_counter()
+store = load_artifact(version).store
+print(f"\nMapped {store.n_rows} songs x {store.n_features} features "
+      f"({store.nnz} nonzeros, {store.disk_bytes() / 2**20:.1f} MiB on disk) "
+      f"in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+
+print("\nVerifying first 5 features:")
+if store.n_rows:
+    first_id = int(store.ids[0])
+    for feature_name, tfidf_value in list(store.features(first_id).items())[:5]:
+        print((first_id, feature_name, tfidf_value))
+
+print("TF-IDF features have been successfully stored.")
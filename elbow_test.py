@@ -1,5 +1,9 @@
+import argparse
+import json
 import sys
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Add the backend directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -7,10 +11,10 @@ backend_dir = os.path.join(current_dir, 'backend')
 sys.path.append(backend_dir)
 
 import django
-import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from threadpoolctl import threadpool_limits
 import matplotlib
 matplotlib.use('Agg')  # Set the backend to non-interactive
 import matplotlib.pyplot as plt
@@ -21,6 +25,13 @@ django.setup()
 
 # Import after Django setup
 from api.models import Lyrics
+from api.embeddings import load_embeddings
+from api.tfidf_artifact import ARTIFACT_DIR, load_artifact
+
+# Per-(k, seed, data version) results, so widening the k range only fits the new values
+ELBOW_DIR = os.path.join(ARTIFACT_DIR, 'elbow')
+
+_worker_data = {}
 
 def calculate_elbow_score(inertias):
     """Calculate the rate of change in inertia to help identify the elbow point"""
@@ -28,40 +39,129 @@ def calculate_elbow_score(inertias):
     change_in_changes = np.diff(inertia_changes)
     return change_in_changes
 
-def perform_elbow_test():
-    # Fetch data from database
-    lyrics_data = list(Lyrics.objects.all().values('id', 'clean_lyrics'))
-    df = pd.DataFrame(lyrics_data)
-    
-    print(f"Processing {len(df)} lyrics records...")
-    
-    # Perform TF-IDF vectorization
-    vectorizer = TfidfVectorizer(max_df=0.8, min_df=3, ngram_range=(1, 2))
-    tfidf_matrix = vectorizer.fit_transform(df['clean_lyrics'].fillna(''))
-    
-    # Perform elbow test
-    inertias = []
-    K = range(2, 21)  # Test from 2 to 20 clusters
-    
-    print("Performing elbow test...")
+def stratified_sample(ids, size, seed):
+    # Proportional sample across the current cluster labels (unlabelled songs are one stratum)
+    rng = np.random.default_rng(seed)
+    labels = dict(Lyrics.objects.values_list('id', 'cluster_label'))
+    strata = {}
+    for position, lyric_id in enumerate(np.asarray(ids).tolist()):
+        strata.setdefault(labels.get(lyric_id), []).append(position)
+    fraction = min(1.0, size / len(ids))
+    picked = []
+    for positions in strata.values():
+        take = max(1, int(round(len(positions) * fraction)))
+        picked.extend(rng.choice(positions, size=min(take, len(positions)), replace=False))
+    return np.sort(np.asarray(picked, dtype=np.int64))
+
+def load_matrix(source):
+    """The matrix described by ``source``, read from the published, memory-mapped artifacts."""
+    tfidf_version, embeddings_version, positions_path = source
+    if embeddings_version:
+        matrix = load_embeddings(version=embeddings_version).vectors
+    else:
+        matrix = load_artifact(version=tfidf_version).matrix
+    if positions_path:
+        matrix = matrix[np.load(positions_path)]
+    return matrix
+
+def prepare_data(args):
+    """Pick the matrix to be swept; returns (source, cache_dir).
+
+    Workers load ``source`` themselves: the TF-IDF and embeddings artifacts
+    are already memory-mapped files, so only a sample's row positions are
+    written out.
+    """
+    artifact = load_artifact()
+    n_rows = artifact.matrix.shape[0]
+    data_version = f"{artifact.version}-tfidf"
+    embeddings_version = None
+    if args.embeddings:
+        embeddings = load_embeddings(tfidf_version=artifact.version)
+        data_version = embeddings_version = embeddings.version
+    print(f"Processing {n_rows} lyrics records (data {data_version})...")
+
+    positions = None
+    if args.sample:
+        positions = stratified_sample(artifact.ids, args.sample, args.seed)
+        data_version += f"-sample{args.sample}r{args.seed}"
+        print(f"Using a stratified sample of {len(positions)} songs")
+
+    cache_dir = os.path.join(ELBOW_DIR, data_version)
+    os.makedirs(cache_dir, exist_ok=True)
+    positions_path = None
+    if positions is not None:
+        positions_path = os.path.join(cache_dir, 'positions.npy')
+        np.save(positions_path, positions)
+    return (artifact.version, embeddings_version, positions_path), cache_dir
+
+def fit_k(source, k, args):
+    # Runs in a worker: the artifacts are memory-mapped, shared between all workers
+    X = _worker_data.get(source)
+    if X is None:
+        X = _worker_data[source] = load_matrix(source)
+    start_time = time.perf_counter()
+    # One BLAS/OpenMP thread per worker; the pool provides the parallelism
+    with threadpool_limits(1):
+        if args.algorithm == 'minibatch':
+            km = MiniBatchKMeans(n_clusters=k, n_init=args.n_init, max_iter=args.max_iter,
+                                 batch_size=4096, random_state=args.seed)
+        else:
+            km = KMeans(n_clusters=k, max_iter=args.max_iter, n_init=args.n_init,
+                        random_state=args.seed)
+        km.fit(X)
+        silhouette = float(silhouette_score(
+            X, km.labels_, sample_size=min(args.silhouette_sample, X.shape[0]),
+            random_state=args.seed
+        ))
+    return {
+        'k': k,
+        'inertia': float(km.inertia_),
+        'silhouette': silhouette,
+        'seconds': time.perf_counter() - start_time,
+    }
+
+def cache_path(cache_dir, k, args):
+    return os.path.join(
+        cache_dir,
+        f"k{k}-seed{args.seed}-{args.algorithm}-init{args.n_init}-iter{args.max_iter}"
+        f"-sil{args.silhouette_sample}.json"
+    )
+
+def perform_elbow_test(args):
+    source, cache_dir = prepare_data(args)
+    K = list(range(args.k_min, args.k_max + 1))
+
+    results = {}
     for k in K:
-        print(f"Testing k={k}")
-        km = KMeans(
-            n_clusters=k,
-            max_iter=10000,
-            n_init=10,
-            random_state=42
-        )
-        km.fit(tfidf_matrix)
-        inertias.append(km.inertia_)
+        path = cache_path(cache_dir, k, args)
+        if os.path.exists(path) and not args.refresh:
+            with open(path, encoding='utf-8') as f:
+                results[k] = json.load(f)
+    missing = [k for k in K if k not in results]
+    print(f"Performing elbow test: {len(K) - len(missing)} k values cached, fitting {len(missing)}...")
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(fit_k, source, k, args) for k in missing]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result['k']] = result
+            with open(cache_path(cache_dir, result['k'], args), 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            print(f"Tested k={result['k']} in {result['seconds']:.1f}s")
+
+    inertias = [results[k]['inertia'] for k in K]
+    silhouettes = [results[k]['silhouette'] for k in K]
     
-    # Plot the elbow curve
-    plt.figure(figsize=(10, 6))
-    plt.plot(K, inertias, 'bx-')
-    plt.xlabel('Number of Clusters (k)')
-    plt.ylabel('Inertia')
-    plt.title('Elbow Method For Optimal k')
-    plt.grid(True)
+    # Plot the elbow curve with the sampled silhouette alongside
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(K, inertias, 'bx-')
+    ax.set_xlabel('Number of Clusters (k)')
+    ax.set_ylabel('Inertia')
+    ax.set_title('Elbow Method For Optimal k')
+    ax.grid(True)
+    silhouette_ax = ax.twinx()
+    silhouette_ax.plot(K, silhouettes, 'ro--')
+    silhouette_ax.set_ylabel(f'Silhouette (sample of {args.silhouette_sample})')
     
     # Save the plot with high DPI for better quality
     plot_path = os.path.join(current_dir, 'elbow_test.png')
@@ -71,9 +171,9 @@ def perform_elbow_test():
     # Calculate and print the analysis
     print("\nAnalysis:")
     print("----------")
-    print("Inertia values:")
-    for k, inertia in zip(K, inertias):
-        print(f"k={k}: {inertia:,.2f}")
+    print("Inertia and sampled silhouette values:")
+    for k, inertia, silhouette in zip(K, inertias, silhouettes):
+        print(f"k={k}: {inertia:,.2f}  silhouette {silhouette:.4f}")
     
     # Calculate percentage decrease
     print("\nPercentage decrease in inertia:")
@@ -82,10 +182,27 @@ def perform_elbow_test():
         print(f"From k={K[i-1]} to k={K[i]}: {decrease:.2f}%")
     
     # Suggest optimal k based on rate of change
-    changes = calculate_elbow_score(inertias)
-    suggested_k = K[np.argmin(changes) + 1]
-    print(f"\nBased on the rate of change analysis, the suggested number of clusters is: {suggested_k}")
+    if len(K) >= 3:
+        changes = calculate_elbow_score(inertias)
+        suggested_k = K[np.argmin(changes) + 1]
+        print(f"\nBased on the rate of change analysis, the suggested number of clusters is: {suggested_k}")
+    print(f"Highest sampled silhouette: k={K[int(np.argmax(silhouettes))]}")
     print("\nNote: Please review the elbow_test.png plot to confirm this suggestion visually.")
 
 if __name__ == "__main__":
-    perform_elbow_test()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sweep k for KMeans and plot inertia and silhouette.")
+    parser.add_argument('--k-min', type=int, default=2)
+    parser.add_argument('--k-max', type=int, default=20)
+    parser.add_argument('--algorithm', choices=['kmeans', 'minibatch'], default='kmeans')
+    parser.add_argument('--n-init', type=int, default=10)
+    parser.add_argument('--max-iter', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--sample', type=int, default=None,
+                        help='Sweep a sample of this many songs, stratified by current cluster label')
+    parser.add_argument('--embeddings', action='store_true',
+                        help='Sweep the LSA embeddings from compute_embeddings.py instead of TF-IDF')
+    parser.add_argument('--silhouette-sample', type=int, default=5000,
+                        help='Songs used to estimate the silhouette score')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached results and refit')
+    perform_elbow_test(parser.parse_args())
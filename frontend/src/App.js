@@ -34,11 +34,16 @@ function App() {
     setLoading(true);
     try {
       const response = await fetch(
-        `http://localhost:8000/api/lyrics/?page=${page}&title=${searchTitle}&artist=${selectedArtist}`
+        `http://localhost:8000/api/lyrics/?page=${page}&title=${searchTitle}&artist=${selectedArtist}&count=1`
       );
       const data = await response.json();
       setLyrics(data.results);
-      setTotalPages(Math.ceil(data.count / 10));
+      // count is null when the API skipped counting; fall back to the next link
+      if (data.count != null) {
+        setTotalPages(Math.max(1, Math.ceil(data.count / 10)));
+      } else {
+        setTotalPages(data.next ? page + 1 : page);
+      }
     } catch (error) {
       console.error('Error fetching lyrics:', error);
     }
@@ -1,62 +1,25 @@
-import sqlite3
-import csv
+import argparse
 import os
+import sys
 
-def import_lyrics(csv_file_path, db_path):
-    # Connect to SQLite database using the full path
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS lyrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            artist TEXT,
-            title TEXT,
-            lyric TEXT
-        )
-    ''')
-    
-    # Clear existing data (optional)
-    cursor.execute('DELETE FROM lyrics')
-    
-    # Read and import CSV
-    with open(csv_file_path, 'r', encoding='utf-8') as file:
-        csv_reader = csv.DictReader(file)
-        
-        batch = []
-        count = 0
-        
-        for row in csv_reader:
-            batch.append((
-                row['Artist'],
-                row['Title'],
-                row['Lyric']
-            ))
-            
-            # Insert in batches of 1000
-            if len(batch) >= 1000:
-                cursor.executemany('INSERT INTO lyrics (artist, title, lyric) VALUES (?, ?, ?)', batch)
-                conn.commit()
-                batch = []
-                count += 1000
-                print(f'Imported {count} records...')
-        
-        # Insert any remaining records
-        if batch:
-            cursor.executemany('INSERT INTO lyrics (artist, title, lyric) VALUES (?, ?, ?)', batch)
-            conn.commit()
-            count += len(batch)
-    
-    print('Successfully imported lyrics data')
-    print(f'Total records imported: {count}')
-    
-    conn.close()
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(current_dir, 'backend')
+sys.path.append(backend_dir)
 
-# Define exact file paths
-csv_file_path = '/Users/owenmendiola/Desktop/2Brain/Projects/DATA_5420/mvpapp/clean_consolidated_lyrics.csv'
-db_path = '/Users/owenmendiola/Desktop/2Brain/Projects/DATA_5420/mvpapp/backend/db.sqlite3'
+from api.importer import import_lyrics
 
-# Run the import
+
+# Run the import; `python backend/manage.py import_lyrics` does the same
 if __name__ == '__main__':
-    import_lyrics(csv_file_path, db_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bulk-load lyrics from a CSV (or .csv.gz) file.")
+    parser.add_argument('csv_path', help='CSV file with Artist, Title and Lyric columns')
+    parser.add_argument('--db', default=os.path.join(backend_dir, 'db.sqlite3'),
+                        help='Path to the SQLite database')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows per transaction and checkpoint')
+    parser.add_argument('--cache-mb', type=int, default=512, help='SQLite page cache during the load')
+    parser.add_argument('--restart', action='store_true', help='Ignore any checkpoint and start over')
+    args = parser.parse_args()
+
+    import_lyrics(args.csv_path, args.db, batch_size=args.batch_size,
+                  restart=args.restart, cache_mb=args.cache_mb)
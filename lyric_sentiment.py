@@ -1,15 +1,23 @@
-from transformers import pipeline
+import os
+import sys
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(current_dir, 'backend')
+sys.path.append(backend_dir)
+
+import django
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+# Import after Django setup
+from api.sentiment import get_sentiment_model
 
 def analyze_sentiment(text):
-    # Initialize the sentiment analysis pipeline
-    sentiment_analyzer = pipeline(
-        "sentiment-analysis",
-        model="siebert/sentiment-roberta-large-english",
-        return_all_scores=True
-    )
-    
-    # Get the sentiment scores
-    results = sentiment_analyzer(text)
+    # The process-wide model registry: one model and tokenizer, loaded once
+    results = get_sentiment_model().pipeline(text)
     
     # Return the results for the first input (results[0] contains list of sentiments)
     return results[0]